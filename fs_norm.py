@@ -1,16 +1,153 @@
 import pandas as pd
+import numpy as np
 import traceback
 import openpyxl
 import math
-import csv
 import re
 import os
+import string
+import json
+import hashlib
+import difflib
+import time
+from itertools import islice, count
+from contextlib import nullcontext
+from collections import OrderedDict
+
+class NormalizationPlan:
+    # A vendor rule spec compiled once (see FSNormalizer.compile_rules). Spec keys, all optional:
+    #   column_map: vendor column -> input column normalize_data expects, e.g. {'Zip': 'PostalCode'}
+    #   value_maps: output column -> {value: replacement}; unmapped values are kept
+    #   derived:    new output column -> template over output columns, e.g. '{first_name} {last_name}'
+    #   renames:    output column -> new name, applied on top of the default renames
+    #   drops:      output columns to leave out, in addition to the default drops
+    def __init__(self, spec, default_renames, default_drops):
+        self.spec = spec
+        self.column_map = dict(spec.get('column_map', {}))
+        self.value_maps = dict(spec.get('value_maps', {}))
+        self.derived = {name: self.parse_template(template) for name, template in spec.get('derived', {}).items()}
+        self.renames = dict(default_renames)
+        self.extra_renames = dict(spec.get('renames', {}))
+        self.drops = set(default_drops) | set(spec.get('drops', []))
+
+    @staticmethod
+    def parse_template(template):
+        # '{first_name} {last_name}' -> [(True, 'first_name'), (False, ' '), (True, 'last_name')]
+        parts = []
+        for literal, field, _, _ in string.Formatter().parse(template):
+            if literal:
+                parts.append((False, literal))
+            if field is not None:
+                parts.append((True, field))
+        return parts
+
+    def input_name(self, column):
+        return self.column_map.get(column, column)
+
+    def output_name(self, column):
+        name = self.renames.get(column, column)
+        return self.extra_renames.get(name, name)
+
+    def prepare(self, df):
+        # Vendor columns -> the input columns normalize_data works on
+        return df.rename(columns=self.column_map) if self.column_map else df
+
+    def finish(self, df):
+        # Value maps and derived fields, then every rename and drop as one projection of the frame
+        output_names = {column: self.output_name(column) for column in df.columns}
+        columns_by_output = {name: column for column, name in output_names.items()}
+
+        for name, mapping in self.value_maps.items():
+            column = columns_by_output.get(name)
+            if column is not None:
+                values = df[column].astype(object)
+                mapped = values.map(mapping)
+                df[column] = mapped.where(mapped.notna(), values)
+
+        for name, parts in self.derived.items():
+            derived = pd.Series('', index=df.index, dtype=object)
+            for is_field, part in parts:
+                if not is_field:
+                    derived = derived + part
+                    continue
+                if part not in columns_by_output:
+                    raise ValueError(f"Derived column {name} uses unknown column: {part}")
+                values = df[columns_by_output[part]].astype(object)
+                derived = derived + values.where(values.notna(), '').astype(str)
+            # Blank fields leave no stray separators at the ends ('{first_name} {last_name}' with no first name -> 'Smith')
+            df[name] = derived.str.strip()
+            output_names[name] = name
+
+        kept = [column for column in df.columns if output_names[column] not in self.drops]
+        df = df[kept]
+        df.columns = [output_names[column] for column in kept]
+        return df
 
 class FSNormalizer:
     def __init__(self):
         
         self.path_to_desktop = '/Users/tws/Desktop/'
         self.processing_subfolder = 'LEAD-NORM/'
+
+        # bump when normalize_data changes behavior; part of rules_fingerprint, which keys cached results
+        self.rules_version = 3
+
+        # salutations stripped from the front of full names, checked in order
+        self.salutations = ["Mrs.","Mrs ","Mr. ","Mr ","Miss ","Dr. ","Dr ","Ms. ","Ms ","Prof. ","Prof "]
+
+        # input columns consumed by normalize_data: read as text, low-cardinality fields as categoricals
+        self.input_dtypes = {
+            'First Name' : str,
+            'Last Name' : str,
+            'Company' : str,
+            'Email' : str,
+            'Phone' : str,
+            'Street' : str,
+            'Street2' : str,
+            'City' : str,
+            'PostalCode' : str,
+            'StateCode' : 'category',
+            'CountryCode' : 'category',
+            'LeadSource' : 'category',
+            'MBL_Profession__c' : 'category'
+            }
+
+        # extra vendor columns carried through to the output; None reads every column
+        self.passthrough_columns = []
+
+        # columns renamed and dropped after normalization; vendor rule specs build on these (see compile_rules)
+        self.output_renames = {
+            'First Name': 'first_name',
+            'Last Name': 'last_name',
+            'Company': 'account_name',
+            'Email': 'account_email',
+            'Street': 'address',
+            'Street2': 'address_2',
+            'Phone': 'account_phone',
+            'CountryCode': 'country_code',
+            'StateCode': 'state_code',
+            'PostalCode': 'zip_postal',
+            'LeadSource': 'lead_source',
+            'City': 'city'
+            }
+        self.output_drops = ['address_2']
+
+        # compiled NormalizationPlans, keyed by their rule spec
+        self.compiled_rules = {}
+
+        # optional RunReport that records per-stage timings (see stage)
+        self.report = None
+
+        # output writers used by normalize_file, keyed by output format
+        self.output_writers = {
+            'xlsx': self.write_xlsx,
+            'csv': self.write_csv,
+            'parquet': self.write_parquet
+            }
+
+        # lookup tables used by vlookup, indexed on first use (see load_lookup_table)
+        self.lookup_cache = OrderedDict()
+        self.lookup_cache_size = 8
         
         # profession normalization  
         self.professions_substitutions = {
@@ -99,6 +236,14 @@ class FSNormalizer:
             'FITPR' : 'PT - Personal Trainers'     
             }
         
+        # profession index keyed on canonical text (see profession_index) and fuzzy matches of values it does not hold
+        self.compiled_professions = None
+        self.profession_matches = {}
+        self.profession_match_cutoff = 0.85
+
+        # unmapped profession values -> row count, accumulated by normalize_data until reset
+        self.unmapped_professions = {}
+
         self.us_states = {
             'AL': 'Alabama',
             'AK': 'Alaska',
@@ -149,8 +294,88 @@ class FSNormalizer:
             'WA': 'Washington',
             'WV': 'West Virginia',
             'WI': 'Wisconsin',
-            'WY': 'Wyoming'
+            'WY': 'Wyoming',
+            'DC': 'District of Columbia'
+            }
+
+        # country values treated as US for ZIP/state checks (missing countries count as US)
+        self.us_country_names = ['US', 'USA', 'United States', 'United States of America']
+
+        # ZIP3 prefix -> state code array built from zip3_states.csv (see build_zip3_table), memory-mapped on first use
+        self.zip3_table_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zip3_states.npy')
+        self.zip3_table = None
+
+        # when set, normalize_data writes the per-row ZIP/state mismatch flags to this column
+        self.geo_flag_column = None
+
+        # opt-in compact output: these columns as categoricals, other text as Arrow-backed strings (see compact_frame)
+        self.compact = False
+        self.compact_columns = ['MBL_Profession__c', 'StateCode', 'CountryCode', 'LeadSource']
+
+        # column -> memory before/after compaction, accumulated by normalize_data until reset
+        self.memory_report = {}
+
+    def rules_fingerprint(self, rules=None):
+        # Hash of everything that decides normalized output, so cached results are dropped when any rule changes
+        fingerprint = {
+            'version': self.rules_version,
+            'professions_substitutions': self.professions_substitutions,
+            'salutations': self.salutations,
+            'input_dtypes': {column: str(dtype) for column, dtype in self.input_dtypes.items()},
+            'passthrough_columns': self.passthrough_columns,
+            'profession_match_cutoff': self.profession_match_cutoff,
+            'us_states': self.us_states,
+            'geo_flag_column': self.geo_flag_column,
+            'output_renames': self.output_renames,
+            'output_drops': self.output_drops,
+            'vendor_rules': rules or {}
             }
+        return hashlib.sha256(json.dumps(fingerprint, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def load_rules(self, file_path):
+        # Vendor rule spec (see NormalizationPlan) from a .json or .yaml/.yml file; YAML needs PyYAML
+        with open(file_path, 'r', encoding='utf-8') as rules_file:
+            if os.path.splitext(file_path)[1].lower() in ('.yaml', '.yml'):
+                import yaml
+                return yaml.safe_load(rules_file) or {}
+            return json.load(rules_file)
+
+    def compile_rules(self, rules=None):
+        # Compile a vendor rule spec once and reuse the plan for every file (and chunk) from that vendor
+        rules = rules or {}
+        key = json.dumps(rules, sort_keys=True, default=str)
+        if key not in self.compiled_rules:
+            self.compiled_rules[key] = NormalizationPlan(rules, self.output_renames, self.output_drops)
+        return self.compiled_rules[key]
+
+    def apply_column_operations(self, headers, data, operations):
+        # add_column/remove_column/rename_column fused into one pass over the rows.
+        # operations: ('add', column, after_column or None), ('remove', column), ('rename', column, new_column)
+        sources = {header: header for header in headers}
+        new_headers = list(headers)
+        for operation in operations:
+            if operation[0] == 'add':
+                _, column_name, after_column = operation
+                position = new_headers.index(after_column) + 1 if after_column in new_headers else len(new_headers)
+                new_headers.insert(position, column_name)
+                sources[column_name] = None
+            elif operation[0] == 'remove':
+                new_headers.remove(operation[1])
+                del sources[operation[1]]
+            elif operation[0] == 'rename':
+                _, column_name, new_column_name = operation
+                new_headers[new_headers.index(column_name)] = new_column_name
+                sources[new_column_name] = sources.pop(column_name)
+            else:
+                raise ValueError(f"Unsupported column operation: {operation[0]}")
+
+        # Each row dict is updated in place (callers holding a row see the change) and ends up keyed by the new headers, in order
+        fields = [(header, sources[header]) for header in new_headers]
+        for row in data:
+            values = {header: row[source] if source is not None else '' for header, source in fields}
+            row.clear()
+            row.update(values)
+        headers[:] = new_headers
 
     def add_column(self, headers, data, column_name, after_column=None):
         if after_column is None:
@@ -180,13 +405,37 @@ class FSNormalizer:
             row[new_column_name] = row[column_name]
             del row[column_name]
 
-    def vlookup(self, filename, lookup_column, lookup_value, return_column):
+    def load_lookup_table(self, filename, lookup_column):
+        # Read a lookup CSV once and index it on lookup_column; cached by path + modification time (LRU)
         desktop_filename = f'{self.path_to_desktop}{filename}'
-        with open(desktop_filename, 'r', encoding='utf-8') as vf:
-            reader = csv.DictReader(vf)
-            for row in reader:
-                if row[lookup_column] == lookup_value:
-                    return row[return_column]
+        cache_key = (desktop_filename, os.stat(desktop_filename).st_mtime_ns, lookup_column)
+        if cache_key in self.lookup_cache:
+            self.lookup_cache.move_to_end(cache_key)
+            return self.lookup_cache[cache_key]
+
+        table = pd.read_csv(desktop_filename, dtype=str, keep_default_na=False, encoding='utf-8')
+        # Like the row scan this replaces, the first matching row wins
+        table = table.drop_duplicates(subset=lookup_column, keep='first').set_index(lookup_column)
+
+        # Drop entries for older versions of the same file before caching the new index
+        for key in [key for key in self.lookup_cache if key[0] == desktop_filename and key[2] == lookup_column]:
+            del self.lookup_cache[key]
+        self.lookup_cache[cache_key] = table
+        while len(self.lookup_cache) > self.lookup_cache_size:
+            self.lookup_cache.popitem(last=False)
+        return table
+
+    def vlookup(self, filename, lookup_column, lookup_value, return_column):
+        table = self.load_lookup_table(filename, lookup_column)
+        if lookup_value not in table.index:
+            return None
+        return table.at[lookup_value, return_column]
+
+    def vlookup_column(self, df, filename, lookup_column, return_column, on, new_column=None):
+        # Bulk vlookup: enrich df with return_column for every value in df[on] in a single hash join
+        table = self.load_lookup_table(filename, lookup_column)
+        df[new_column or return_column] = df[on].map(table[return_column])
+        return df
 
     def normalize_zip(self, zip_code):
         if pd.isna(zip_code):
@@ -196,83 +445,491 @@ class FSNormalizer:
             zip_code = zip_code.split("-")[0]
         return zip_code[:5].zfill(5)
 
+    def as_text(self, values):
+        # astype(str), minus the full copy when the column already holds nothing but text
+        if pd.api.types.infer_dtype(values, skipna=True) == 'string' and not values.isna().any():
+            return values
+        return values.astype(str)
+
+    def normalize_zips(self, zip_codes):
+        # Column-level normalize_zip: text before any '-', float '.0' suffix dropped, first five characters, zero-padded.
+        # Each distinct value is normalized once (string ops on the uniques, then a take back out to every row).
+        # Returns the normalized column (missing and blank values become missing) and a per-row flag for 5-digit ZIPs.
+        if pd.api.types.is_numeric_dtype(zip_codes):
+            zip_codes = zip_codes.round().astype('Int64')
+        codes, uniques = pd.factorize(zip_codes)
+        zips = pd.Series(uniques, dtype=object).astype(str).str.strip().str.replace(r'-.*$|\.0+$', '', regex=True).str[:5]
+        # A blank (or whitespace-only) ZIP is missing, not '00000'
+        zips = zips.str.zfill(5).mask(zips == '')
+        valid = zips.str.fullmatch(r'\d{5}', na=False)
+        # factorize codes missing values as -1, which picks the trailing NaN/False slot
+        zips = np.append(zips.to_numpy(dtype=object), np.nan)[codes]
+        valid = np.append(valid.to_numpy(dtype=bool), False)[codes]
+        return pd.Series(zips, index=zip_codes.index, name=zip_codes.name), pd.Series(valid, index=zip_codes.index)
+
+    def normalize_states(self, states):
+        # Full state names and codes (any case, spacing or punctuation) -> two-letter code, resolved once per distinct value.
+        # Returns (states, recognized); unrecognized values are kept stripped and missing values stay missing.
+        index = {}
+        for code, name in self.us_states.items():
+            index[self.canonical_text(code)] = code
+            index[self.canonical_text(name)] = code
+
+        codes, uniques = pd.factorize(states)
+        resolved = [index.get(self.canonical_text(value)) for value in uniques]
+        values = np.array([code or str(value).strip() for code, value in zip(resolved, uniques)] + [np.nan], dtype=object)
+        recognized = np.array([code is not None for code in resolved] + [False])
+        # factorize codes missing values as -1, which picks the trailing NaN/False slot
+        return pd.Series(values[codes], index=states.index, name=states.name), pd.Series(recognized[codes], index=states.index)
+
+    def build_zip3_table(self, ranges_file=None, table_file=None):
+        # Expand zip3_states.csv (zip3_start, zip3_end, state) into the 1000-entry array load_zip3_table memory-maps
+        ranges_file = ranges_file or f'{os.path.splitext(self.zip3_table_path)[0]}.csv'
+        table_file = table_file or self.zip3_table_path
+        table = np.full(1000, '', dtype='<U2')
+        for start, end, state in pd.read_csv(ranges_file, dtype=str).itertuples(index=False):
+            table[int(start):int(end) + 1] = state
+        np.save(table_file, table)
+        self.zip3_table = None
+        return table
+
+    def load_zip3_table(self):
+        if self.zip3_table is None:
+            self.zip3_table = np.load(self.zip3_table_path, mmap_mode='r')
+        return self.zip3_table
+
+    def zip_state_mismatches(self, zips, states, countries=None):
+        # Per-row flag: a US row whose 5-digit ZIP belongs (by its ZIP3 prefix) to another state than its state code.
+        # Rows with an invalid ZIP, an unrecognized state or an unassigned prefix are not flagged.
+        # Prefixes and states are looked up once per distinct value
+        table = self.load_zip3_table()
+        codes, uniques = pd.factorize(zips)
+        unique_zips = pd.Series(uniques, dtype=object).astype(str)
+        valid = unique_zips.str.fullmatch(r'\d{5}').to_numpy(dtype=bool)
+        expected = np.full(len(uniques) + 1, '', dtype='<U2')
+        expected[:-1][valid] = table[unique_zips[valid].str[:3].astype(int).to_numpy()]
+        expected = expected[codes]
+
+        codes, uniques = pd.factorize(states)
+        state_codes = np.array([value if value in self.us_states else '' for value in uniques] + [''], dtype='<U2')[codes]
+        mismatch = (expected != '') & (state_codes != '') & (expected != state_codes)
+
+        if countries is not None:
+            us_keys = {self.canonical_text(name) for name in self.us_country_names}
+            codes, uniques = pd.factorize(countries)
+            is_us = np.array([self.canonical_text(value) in us_keys for value in uniques] + [True])
+            mismatch &= is_us[codes]
+        return pd.Series(mismatch, index=zips.index)
+
+    def compact_frame(self, df, categorical_columns=()):
+        # categorical_columns as categoricals, every other text column as Arrow-backed strings ('string' without pyarrow).
+        # Returns the compacted frame and {column: memory/dtype before and after}.
+        try:
+            import pyarrow  # noqa: F401
+            text_dtype = 'string[pyarrow]'
+        except ImportError:
+            text_dtype = 'string'
+
+        conversions = {}
+        for column in df.columns:
+            if column in categorical_columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+                conversions[column] = 'category'
+            elif column not in categorical_columns and df[column].dtype == object:
+                conversions[column] = text_dtype
+
+        before = df.memory_usage(index=False, deep=True)
+        dtypes_before = df.dtypes.astype(str)
+        df = df.astype(conversions)
+        after = df.memory_usage(index=False, deep=True)
+        report = {column: {'dtype_before': dtypes_before[column], 'dtype_after': str(df[column].dtype),
+                           'bytes_before': int(before[column]), 'bytes_after': int(after[column])} for column in df.columns}
+        return df, report
+
+    def normalize_phones(self, phones):
+        # Column-level phone cleanup: digits only, extension and the '.0' of a float-like value ('5551234567.0') dropped, leading US '1' removed.
+        # Returns the cleaned column (missing values stay missing) and a per-row flag for 10-digit numbers.
+        present = phones.notna()
+        if pd.api.types.is_numeric_dtype(phones):
+            phones = phones.round().astype('Int64')
+        digits = self.as_text(phones).str.strip().str.replace(r'^(\d+)\.0+$', r'\1', regex=True)
+        digits = digits.str.replace(r'(?i)\s*(?:ext\.?|extension|x|#)\s*\d+\s*$|\D', '', regex=True)
+        digits = digits.str.replace(r'^1(?=\d{10}$)', '', regex=True)
+        valid = present & (digits.str.len() == 10)
+        return digits.where(present), valid
+
     def split_name(self, full_name):
+        # Per-value split_names, with the same rules: leading salutation and anything after a comma dropped,
+        # first word is the first name and the rest the last name
         if pd.isna(full_name):
             return pd.Series(['', ''])
-    
-        list_of_salutations = ["Mrs.","Mrs ","Mr. ","Mr ","Miss ","Dr. ","Dr ","Ms. ","Ms "]
-        
-        for salutation in list_of_salutations:
+
+        full_name = str(full_name)
+        for salutation in self.salutations:
             if full_name.startswith(salutation):
-                full_name = full_name.replace(salutation, "").strip()
+                full_name = full_name[len(salutation):]
                 break
-        
-        full_name = re.sub(r',.*', '', full_name)
+
+        full_name = re.sub(r',.*', '', full_name).strip()
         parts = full_name.split(maxsplit=1)
-        return pd.Series([parts[0], parts[-1] if len(parts) > 1 else ''])
+        return pd.Series([parts[0] if parts else '', parts[1] if len(parts) > 1 else ''])
+
+    def split_names(self, full_names):
+        # Column-level split_name: one regex pass over the whole Series, returns aligned first_name/last_name columns
+        salutation_pattern = '^(?:' + '|'.join(re.escape(salutation) for salutation in self.salutations) + ')'
+        names = full_names.fillna('').astype(str)
+        names = names.str.replace(salutation_pattern, '', regex=True)
+        names = names.str.replace(r',.*', '', regex=True).str.strip()
+        parts = names.str.extract(r'^(\S*)\s*(.*)$', flags=re.DOTALL)
+        parts.columns = ['first_name', 'last_name']
+        return parts
     # ================
 
+    def canonical_text(self, value):
+        # Canonical text professions and states are indexed and looked up by: case, whitespace and punctuation insensitive
+        return ' '.join(re.sub(r'[^\w\s]', '', str(value)).lower().split())
+
+    def profession_index(self):
+        # (canonical key -> mapped profession, sorted mapped professions), rebuilt only when professions_substitutions changes
+        if self.compiled_professions is None or self.compiled_professions[0] != self.professions_substitutions:
+            index = {self.canonical_text(value): target for value, target in self.professions_substitutions.items()}
+            categories = sorted(set(self.professions_substitutions.values()))
+            self.compiled_professions = (dict(self.professions_substitutions), index, categories)
+            self.profession_matches = {}
+        return self.compiled_professions[1], self.compiled_professions[2]
+
+    def match_profession(self, key):
+        # Fuzzy fallback for a key the index does not hold; memoized, so each distinct value is matched only once
+        if key not in self.profession_matches:
+            index, _ = self.profession_index()
+            close = difflib.get_close_matches(key, list(index), n=1, cutoff=self.profession_match_cutoff)
+            self.profession_matches[key] = index[close[0]] if close else None
+        return self.profession_matches[key]
+
+    def map_professions(self, professions):
+        # Map a whole column through the profession index, resolving each distinct value once.
+        # Returns (categorical Series, {unmapped value: row count}); missing and blank values stay NaN.
+        index, categories = self.profession_index()
+        codes, uniques = pd.factorize(professions)
+
+        category_codes = np.full(len(uniques) + 1, -1)  # last slot: missing values (factorize code -1)
+        unmapped = []
+        for i, value in enumerate(uniques):
+            key = self.canonical_text(value)
+            if not key:
+                continue
+            target = index.get(key) or self.match_profession(key)
+            if target is None:
+                unmapped.append(i)
+            else:
+                category_codes[i] = categories.index(target)
+
+        mapped = pd.Series(pd.Categorical.from_codes(category_codes[codes], categories=categories),
+                           index=professions.index, name=professions.name)
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        return mapped, {str(uniques[i]): int(counts[i]) for i in unmapped}
+
     def ensure_dir_exists(self, file_path):
         # Ensure directory exists
         directory = os.path.dirname(file_path)
         if directory and not os.path.exists(directory):
             os.makedirs(directory)
 
-    def normalize_data(self, df):
-     
+    def stage(self, name, rows=None):
+        # Record a pipeline stage on the attached RunReport (see run_report.py); a no-op when no report is attached
+        return self.report.stage(name, rows) if self.report is not None else nullcontext({})
+
+    def normalize_data(self, df, rules=None):
+        plan = self.compile_rules(rules)
+
+        # Vendor column mapping
+        df = plan.prepare(df)
+
         # Apply normalization logic
-        # Address handling
-        df['Street'] = df['Street'].astype(str).str.strip() if len(str(df['Street'])) > 3 else ''
-        df['Street2'] = df['Street2'].astype(str).str.strip() if len(str(df['Street'])) > 3 else ''
-        df['Street'] = df.apply(lambda row: f"{row['Street']}, {row['Street2']}" if 'nan' not in str(row['Street2']).lower() else row['Street'] if 'nan' not in str(row['Street']).lower() else '', axis=1)
+        # Address handling (column-level: join Street2 onto Street unless either holds a 'nan' marker)
+        with self.stage('address merge', len(df)):
+            street = self.as_text(df['Street']).str.strip()
+            street_2 = self.as_text(df['Street2']).str.strip()
+            street_ok = ~street.str.contains('nan', case=False, regex=False)
+            street_2_ok = ~street_2.str.contains('nan', case=False, regex=False)
+            df['Street2'] = street_2
+            df['Street'] = (street + ', ' + street_2).where(street_2_ok, street.where(street_ok, ''))
 
-        # ZIP code normalization
-        df['PostalCode'] = df['PostalCode'].astype(str).apply(self.normalize_zip) if 'nan' not in str(df['PostalCode']).lower() else ''
+        # ZIP and state normalization, each ZIP cross-checked against the state its ZIP3 prefix belongs to
+        with self.stage('geo validation', len(df)) as record:
+            df['PostalCode'] = self.normalize_zips(df['PostalCode'])[0].fillna('')
+            if 'StateCode' in df.columns:
+                df['StateCode'], _ = self.normalize_states(df['StateCode'])
+                mismatch = self.zip_state_mismatches(df['PostalCode'], df['StateCode'], df.get('CountryCode'))
+                record['zip_state_mismatches'] = int(mismatch.sum())
+                if self.geo_flag_column:
+                    df[self.geo_flag_column] = mismatch
 
-        # Account modality mapping
-        df['MBL_Profession__c'] = df['MBL_Profession__c'].astype(str).map(self.professions_substitutions) if len(str(df['MBL_Profession__c'])) > 3 else ''
+        # Phone normalization
+        if 'Phone' in df.columns:
+            with self.stage('phone normalization', len(df)):
+                df['Phone'], _ = self.normalize_phones(df['Phone'])
 
-        # Rename columns
-        df = df.rename(columns={'First Name': 'first_name', 'Last Name': 'last_name', 'Company': 'account_name', 'Email': 'account_email', 
-                                 'Street': 'address', 'Street2': 'address_2', 'Phone': 'account_phone', 'CountryCode': 'country_code',
-                                 'StateCode': 'state_code', 'PostalCode': 'zip_postal', 'LeadSource': 'lead_source', 'City': 'city'})
+        # Account modality mapping (case/spacing/punctuation variants and close misspellings included, see map_professions)
+        with self.stage('profession mapping', len(df)) as record:
+            df['MBL_Profession__c'], unmapped = self.map_professions(df['MBL_Profession__c'])
+            for value, rows in unmapped.items():
+                self.unmapped_professions[value] = self.unmapped_professions.get(value, 0) + rows
+            record['unmapped_values'] = len(unmapped)
 
-        # Remove unwanted columns
-        columns_to_remove = ['address_2']
-        
-        df = df.drop(columns=columns_to_remove, errors='ignore')
+        # Value maps, derived fields, renames and drops (see NormalizationPlan)
+        with self.stage('rename/drop', len(df)):
+            df = plan.finish(df)
+
+        # Opt-in compact column dtypes, with memory before and after per column
+        if self.compact:
+            with self.stage('compact', len(df)):
+                df, report = self.compact_frame(df, [plan.output_name(column) for column in self.compact_columns])
+                for column, usage in report.items():
+                    total = self.memory_report.setdefault(column, dict(usage, bytes_before=0, bytes_after=0))
+                    total['bytes_before'] += usage['bytes_before']
+                    total['bytes_after'] += usage['bytes_after']
 
         return df
 
-    def normalize_file(self, input_file, output_file):
+    def write_csv(self, df, file_path):
+        df.to_csv(file_path, index=False)
+
+    def write_parquet(self, df, file_path):
+        # Requires pyarrow; mixed object columns are written as strings so Arrow does not reject them
+        object_columns = df.select_dtypes(include='object').columns
+        df.astype({column: 'string' for column in object_columns}).to_parquet(file_path, index=False)
+
+    def write_xlsx(self, df, file_path):
+        # xlsxwriter when installed, otherwise an openpyxl write-only workbook streamed row by row
+        try:
+            import xlsxwriter  # noqa: F401
+        except ImportError:
+            workbook = openpyxl.Workbook(write_only=True)
+            sheet = workbook.create_sheet()
+            sheet.append(list(df.columns))
+            for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+                sheet.append(row)
+            workbook.save(file_path)
+        else:
+            df.to_excel(file_path, index=False, engine='xlsxwriter')
+
+    def partial_output_path(self, file_path):
+        # Hidden sibling with the same extension (writers pick their engine from it)
+        directory, filename = os.path.split(file_path)
+        return os.path.join(directory, f'.partial-{filename}')
+
+    def write_output(self, df, file_path, output_format='xlsx'):
+        # Write df with the writer registered for output_format and report throughput
+        if output_format not in self.output_writers:
+            raise ValueError(f"Unsupported output format: {output_format}")
+
+        # Written to a temp sibling and swapped in, so readers never see a half-written output
+        start_time = time.time()
+        with self.stage('write', len(df)):
+            partial_path = self.partial_output_path(file_path)
+            try:
+                self.output_writers[output_format](df, partial_path)
+                os.replace(partial_path, file_path)
+            finally:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+        seconds = time.time() - start_time
+
+        rows_per_second = len(df) / seconds if seconds > 0 else float('inf')
+        print(f"[i] WROTE {len(df)} ROWS AS {output_format.upper()} IN {round(seconds, 2)} SECONDS ({round(rows_per_second)} ROWS/SEC)")
+        return {'format': output_format, 'rows': len(df), 'seconds': seconds, 'rows_per_second': rows_per_second}
+
+    def normalize_file(self, input_file, output_file, raise_errors=False, output_format=None, rules=None):
 
         df = None
 
         try:
             # Read the file into a DataFrame based on its extension
-            _, file_extension = os.path.splitext(input_file)
-            if file_extension.lower() == '.xlsx':
-                df = pd.read_excel(input_file)
-            elif file_extension.lower() == '.csv':
-                df = pd.read_csv(input_file)
-            else:
-                raise ValueError(f"Unsupported file type: {file_extension}")
+            with self.stage('read') as record:
+                df = self.read_input(input_file, rules)
+                record['rows'] = len(df)
 
-            # Ensure the output directory exists
+            # Ensure the output directory exists; an explicit output_format replaces the output extension
+            output_base, output_extension = os.path.splitext(output_file)
+            if output_format is None:
+                output_format = output_extension.lower().lstrip('.') or 'xlsx'
+            else:
+                output_file = f'{output_base}.{output_format}'
             file_path = f'{self.path_to_desktop}{self.processing_subfolder}{output_file}'
             self.ensure_dir_exists(file_path)
 
             # Normalize the data
-            df = self.normalize_data(df)
+            df = self.normalize_data(df, rules)
 
             # Write the output
-            df.to_excel(file_path, index=False)
+            self.write_output(df, file_path, output_format)
 
             print(f"[+] SUCCESS! Output written to: {file_path}")
 
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"An error occurred while processing the file: {str(e)}")
             print("FS Norm Traceback:")
             print(traceback.format_exc())
         
-        return df
\ No newline at end of file
+        return df
+
+    def keep_input_column(self, column):
+        # usecols filter: the columns normalize_data consumes plus the configured passthrough columns
+        return self.passthrough_columns is None or column in self.input_dtypes or column in self.passthrough_columns
+
+    def read_options(self, rules=None):
+        # usecols filter and dtypes for reading an input, with vendor column names mapped through the rule spec
+        plan = self.compile_rules(rules)
+        dtypes = dict(self.input_dtypes)
+        dtypes.update({vendor: self.input_dtypes[column] for vendor, column in plan.column_map.items() if column in self.input_dtypes})
+        return (lambda column: self.keep_input_column(plan.input_name(column))), dtypes
+
+    def excel_engine(self):
+        # calamine (python-calamine) is the fastest read-only xlsx parser; pandas' openpyxl reader is also read-only
+        try:
+            import python_calamine  # noqa: F401
+        except ImportError:
+            return 'openpyxl'
+        return 'calamine'
+
+    def read_input(self, input_file, rules=None):
+        # Projected, typed read: unused vendor columns are skipped and ZIP/phone values stay text instead of floats
+        keep_column, dtypes = self.read_options(rules)
+        _, file_extension = os.path.splitext(input_file)
+        if file_extension.lower() == '.xlsx':
+            return pd.read_excel(input_file, engine=self.excel_engine(), usecols=keep_column, dtype=dtypes)
+        elif file_extension.lower() == '.csv':
+            return pd.read_csv(input_file, usecols=keep_column, dtype=dtypes)
+        else:
+            raise ValueError(f"Unsupported file type: {file_extension}")
+
+    def apply_input_dtypes(self, df, dtypes=None):
+        # Same dtypes as read_input, for frames built from raw cell values; missing values stay NaN
+        for column, dtype in (dtypes or self.input_dtypes).items():
+            if column in df.columns:
+                if dtype == 'category':
+                    df[column] = df[column].astype('category')
+                else:
+                    df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+        return df
+
+    def read_in_chunks(self, input_file, chunksize, rules=None):
+        # Yield the input as DataFrames of at most chunksize rows so the whole file is never held in memory
+        keep_column, dtypes = self.read_options(rules)
+        _, file_extension = os.path.splitext(input_file)
+        if file_extension.lower() == '.csv':
+            yield from pd.read_csv(input_file, chunksize=chunksize, usecols=keep_column, dtype=dtypes)
+        elif file_extension.lower() == '.xlsx':
+            workbook = openpyxl.load_workbook(input_file, read_only=True, data_only=True)
+            try:
+                rows = workbook.active.iter_rows(values_only=True)
+                headers = next(rows, None)
+                if headers is None:
+                    return
+                kept = [i for i, header in enumerate(headers) if keep_column(header)]
+                for chunk_number in count():
+                    block = [[row[i] for i in kept] for row in islice(rows, chunksize)]
+                    # A header-only sheet still yields one empty chunk, as read_csv does, so its output gets the header
+                    if not block and chunk_number > 0:
+                        break
+                    chunk = pd.DataFrame(block, columns=[headers[i] for i in kept])
+                    # Empty cells come back as None; match read_excel, which gives NaN
+                    yield self.apply_input_dtypes(chunk.where(chunk.notna(), float('nan')), dtypes)
+            finally:
+                workbook.close()
+        else:
+            raise ValueError(f"Unsupported file type: {file_extension}")
+
+    def normalize_file_chunked(self, input_file, output_file, chunksize=50000, raise_errors=False, rules=None):
+        # Streaming variant of normalize_file: normalize and append one chunk at a time so memory stays flat.
+        # The output format follows the output_file extension (.csv, .parquet, otherwise a write-only .xlsx).
+
+        rows_written = 0
+        workbook = None
+        parquet_writer = None
+        partial_path = None
+
+        try:
+            # Ensure the output directory exists
+            file_path = f'{self.path_to_desktop}{self.processing_subfolder}{output_file}'
+            self.ensure_dir_exists(file_path)
+            output_format = os.path.splitext(file_path)[1].lower().lstrip('.')
+            partial_path = self.partial_output_path(file_path)
+            start_time = time.time()
+
+            if output_format == 'parquet':
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            elif output_format != 'csv':
+                workbook = openpyxl.Workbook(write_only=True)
+                sheet = workbook.create_sheet()
+
+            chunks = self.read_in_chunks(input_file, chunksize, rules)
+            chunks_written = 0
+            for i in count():
+                # Read the next chunk
+                with self.stage('read') as record:
+                    chunk = next(chunks, None)
+                    record['rows'] = 0 if chunk is None else len(chunk)
+                if chunk is None:
+                    break
+
+                # Normalize the chunk
+                chunk = self.normalize_data(chunk, rules)
+
+                # Append it to the output
+                with self.stage('write', len(chunk)):
+                    if output_format == 'csv':
+                        chunk.to_csv(partial_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+                    elif output_format == 'parquet':
+                        # Every column is written as text so the schema cannot drift between chunks
+                        table = pa.Table.from_pandas(chunk.astype('string'), preserve_index=False)
+                        if parquet_writer is None:
+                            parquet_writer = pq.ParquetWriter(partial_path, table.schema)
+                        parquet_writer.write_table(table)
+                    else:
+                        if i == 0:
+                            sheet.append(list(chunk.columns))
+                        chunk = chunk.astype(object).where(chunk.notna(), None)
+                        for row in chunk.itertuples(index=False, name=None):
+                            sheet.append(row)
+
+                rows_written += len(chunk)
+                chunks_written += 1
+                print(f"[i] {rows_written} ROWS NORMALIZED")
+
+            if not chunks_written:
+                # Nothing to normalize, not even a header row: report it instead of claiming an output
+                print(f"[!] {os.path.basename(input_file)} HAS NO HEADER ROW; NO OUTPUT WRITTEN")
+                return rows_written
+
+            if workbook is not None:
+                with self.stage('write'):
+                    workbook.save(partial_path)
+            if parquet_writer is not None:
+                parquet_writer.close()
+                parquet_writer = None
+            if os.path.exists(partial_path):
+                os.replace(partial_path, file_path)
+
+            seconds = time.time() - start_time
+            rows_per_second = rows_written / seconds if seconds > 0 else float('inf')
+            print(f"[i] STREAMED {rows_written} ROWS IN {round(seconds, 2)} SECONDS ({round(rows_per_second)} ROWS/SEC)")
+            print(f"[+] SUCCESS! Output written to: {file_path}")
+
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"An error occurred while processing the file: {str(e)}")
+            print("FS Norm Traceback:")
+            print(traceback.format_exc())
+
+        finally:
+            if parquet_writer is not None:
+                parquet_writer.close()
+            if partial_path is not None and os.path.exists(partial_path):
+                os.remove(partial_path)
+
+        return rows_written
@@ -0,0 +1,290 @@
+# Benchmarks for the lead normalization pipeline
+'''
+Generates seeded synthetic event exports (salutations, ZIP+4 and float ZIPs, mixed date formats,
+unmapped professions, NaNs), times FSNormalizer and leads_norm_functions against them and
+compares rows/sec with stored baselines.
+
+    python3 leads_bench.py --sizes 10k 1m                  # run every benchmark at 10k and 1M rows
+    python3 leads_bench.py --bench normalize_data --save-baseline
+    python3 leads_bench.py --threshold 0.2                 # exit 1 if anything is >20% slower than its baseline
+    python3 leads_bench.py --bench split_name split_names --sizes 1m --per-value-limit 1000000
+                                                           # per-row vs column-level name splitting on 1M names
+
+Rows/sec depends on the machine, so no baseline ships with the repo: generate bench_baseline.json on the
+machine that runs the comparison (with --save-baseline) before --threshold can flag anything. Benchmarks
+without a baseline are listed as such; add --require-baseline to make that an error instead.
+
+Per-value functions (normalize_zip, split_name, parse_date, format_phone_number, vlookup) are timed on
+at most --per-value-limit rows so the 1M/10M sizes stay practical; their column-level counterparts run
+on every row.
+'''
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from leads_norm_functions import normalizer, parse_date, parse_date_column, format_phone_number
+
+DATASET_SIZES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+DEFAULT_BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+
+# =========================== Synthetic data ===========================
+
+FIRST_NAMES = ['Ann', 'Bob', 'Carla', 'Dev', 'Elena', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jamal', 'Kate', 'Luis', 'Mei', 'Noah', 'Olga', 'Priya']
+LAST_NAMES = ['Lee', 'Ray', 'Garcia', 'Smith', "O'Neil", 'Nguyen', 'Patel', 'Kowalski', 'Johnson', 'Brown', 'Fernando', 'Nantz', 'Ito', 'Moore']
+SALUTATIONS = ['', '', '', 'Dr. ', 'Dr ', 'Mrs. ', 'Mr ', 'Ms. ', 'Miss ']
+NAME_SUFFIXES = ['', '', '', ', MD', ', ND', ', RN', ', DC']
+STREETS = ['Main St', 'Elm Ave', 'Nantucket Rd', 'Oak Blvd', 'Market St', 'Fernando Way', 'Cedar Ln']
+STREET_2 = ['Suite 100', 'Apt 4B', 'Unit 7', 'Floor 2']
+CITIES = ['Austin', 'Boston', 'Denver', 'Portland', 'Seattle', 'Phoenix', 'Madison']
+STATES = ['TX', 'MA', 'CO', 'OR', 'WA', 'AZ', 'WI', 'Texas', 'massachusetts', ' CA ', 'ny']
+UNMAPPED_PROFESSIONS = ['Yoga Teacher', 'medical doctor', ' Chiropractor ', 'Naturopathic  Doctor', 'N.D.', 'Reiki Master']
+
+
+def pick(rng, values, rows, missing=0.0):
+    # rows random picks from values (as an object array), with a share of NaN
+    picked = np.array(values, dtype=object)[rng.integers(0, len(values), rows)]
+    if missing:
+        picked[rng.random(rows) < missing] = np.nan
+    return picked
+
+def generate_event_export(rows, seed=0):
+    # A synthetic vendor export with the columns normalize_data reads plus full-name and date columns
+    rng = np.random.default_rng(seed)
+
+    first_names = pick(rng, FIRST_NAMES, rows)
+    last_names = pick(rng, LAST_NAMES, rows)
+    full_names = pd.Series(pick(rng, SALUTATIONS, rows)) + first_names + ' ' + last_names + pick(rng, NAME_SUFFIXES, rows)
+    full_names[rng.random(rows) < 0.02] = np.nan
+
+    # ZIPs: 5-digit, ZIP+4, leading zero lost, float-typed and missing
+    zip_codes = pd.Series(rng.integers(501, 99950, rows)).astype(str)
+    zip_style = rng.integers(0, 5, rows)
+    zip_codes = zip_codes.where(zip_style != 0, zip_codes.str.zfill(5))
+    zip_codes = zip_codes.where(zip_style != 1, zip_codes.str.zfill(5) + '-' + pd.Series(rng.integers(1000, 9999, rows)).astype(str))
+    zip_codes = zip_codes.where(zip_style != 2, zip_codes + '.0')
+    zip_codes[rng.random(rows) < 0.03] = np.nan
+
+    # Dates: mm-dd-yyyy, yyyy-mm-dd, with a time, garbage and missing
+    days = pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 730, rows), unit='D')
+    date_style = rng.integers(0, 10, rows)
+    dates = pd.Series(days.strftime('%m-%d-%Y'))
+    dates = dates.where(date_style < 6, pd.Series(days.strftime('%Y-%m-%d')))
+    dates = dates.where(date_style != 8, pd.Series(days.strftime('%Y-%m-%d 10:30:00')))
+    dates = dates.where(date_style != 9, 'TBD')
+    dates[rng.random(rows) < 0.02] = np.nan
+
+    # Phones: formatted, with country code/extension, float-typed digits and missing
+    phone_digits = pd.Series(rng.integers(2_000_000_000, 9_999_999_999, rows)).astype(str)
+    phone_style = rng.integers(0, 4, rows)
+    phones = '(' + phone_digits.str[:3] + ') ' + phone_digits.str[3:6] + '-' + phone_digits.str[6:]
+    phones = phones.where(phone_style != 1, '+1 ' + phone_digits.str[:3] + '-' + phone_digits.str[3:6] + '-' + phone_digits.str[6:] + ' ext 12')
+    phones = phones.where(phone_style != 2, phone_digits + '.0')
+    phones[rng.random(rows) < 0.05] = np.nan
+
+    professions = list(normalizer.professions_substitutions) + UNMAPPED_PROFESSIONS
+
+    return pd.DataFrame({
+        'Full Name': full_names,
+        'First Name': first_names,
+        'Last Name': last_names,
+        'Company': pick(rng, ['Wellness Co', 'Family Clinic', 'Sole Practice', 'Health Partners'], rows, missing=0.3),
+        'Email': 'User' + pd.Series(rng.integers(0, max(rows // 2, 1), rows)).astype(str) + '@Example.com',
+        'Phone': phones,
+        'Street': pd.Series(rng.integers(1, 9999, rows)).astype(str) + ' ' + pick(rng, STREETS, rows),
+        'Street2': pick(rng, STREET_2, rows, missing=0.7),
+        'City': pick(rng, CITIES, rows),
+        'StateCode': pick(rng, STATES, rows, missing=0.02),
+        'CountryCode': pick(rng, ['US', 'US', 'US', 'CA'], rows),
+        'PostalCode': zip_codes,
+        'LeadSource': pick(rng, ['Trade Show', 'Webinar', 'Booth Scan'], rows),
+        'MBL_Profession__c': pick(rng, professions, rows, missing=0.05),
+        'Event Date': dates,
+        })
+
+def load_dataset(rows, seed, data_dir):
+    # Generated once per (rows, seed) and kept as CSV; read back as text like FSNormalizer.read_input does
+    file_path = os.path.join(data_dir, f'leads_{rows}_{seed}.csv')
+    if not os.path.exists(file_path):
+        os.makedirs(data_dir, exist_ok=True)
+        print(f'[i] GENERATING {rows} ROWS -> {file_path}')
+        generate_event_export(rows, seed).to_csv(file_path, index=False)
+    return pd.read_csv(file_path, dtype=str), file_path
+
+
+# =========================== Benchmarks ===========================
+
+# Each benchmark returns a zero-argument callable (the timed part) and the number of rows it processes
+
+def bench_normalize_data(df, context):
+    return (lambda: normalizer.normalize_data(df.copy())), len(df)
+
+def bench_normalize_zip(df, context):
+    sample = df['PostalCode'].head(context['per_value_limit'])
+    return (lambda: sample.apply(normalizer.normalize_zip)), len(sample)
+
+def bench_normalize_zips(df, context):
+    return (lambda: normalizer.normalize_zips(df['PostalCode'])), len(df)
+
+def bench_zip_state_mismatches(df, context):
+    zips, _ = normalizer.normalize_zips(df['PostalCode'])
+    states, _ = normalizer.normalize_states(df['StateCode'])
+    return (lambda: normalizer.zip_state_mismatches(zips.fillna(''), states, df['CountryCode'])), len(df)
+
+def bench_split_name(df, context):
+    sample = df['Full Name'].head(context['per_value_limit'])
+    return (lambda: sample.apply(normalizer.split_name)), len(sample)
+
+def bench_split_names(df, context):
+    return (lambda: normalizer.split_names(df['Full Name'])), len(df)
+
+def bench_parse_date(df, context):
+    sample = df['Event Date'].head(context['per_value_limit'])
+
+    def parse_all():
+        for value in sample:
+            try:
+                parse_date(value)
+            except ValueError:
+                pass
+    return parse_all, len(sample)
+
+def bench_parse_date_column(df, context):
+    return (lambda: parse_date_column(df['Event Date'])), len(df)
+
+def bench_format_phone_number(df, context):
+    sample = df['Phone'].head(context['per_value_limit'])
+    return (lambda: sample.apply(format_phone_number)), len(sample)
+
+def bench_normalize_phones(df, context):
+    return (lambda: normalizer.normalize_phones(df['Phone'])), len(df)
+
+def bench_map_professions(df, context):
+    def map_all():
+        normalizer.profession_matches.clear()
+        normalizer.map_professions(df['MBL_Profession__c'])
+    return map_all, len(df)
+
+def bench_vlookup(df, context):
+    sample = df['Email'].head(context['per_value_limit'])
+
+    def lookup_all():
+        normalizer.lookup_cache.clear()
+        for email in sample:
+            normalizer.vlookup(context['lookup_file'], 'Email', email, 'AccountId')
+    return lookup_all, len(sample)
+
+def bench_vlookup_column(df, context):
+    def lookup_column():
+        normalizer.lookup_cache.clear()
+        normalizer.vlookup_column(df[['Email']].copy(), context['lookup_file'], 'Email', 'AccountId', on='Email')
+    return lookup_column, len(df)
+
+def bench_normalize_file(df, context):
+    return (lambda: normalizer.normalize_file(context['input_file'], 'bench_output.csv', raise_errors=True)), len(df)
+
+BENCHMARKS = {
+    'normalize_data': bench_normalize_data,
+    'normalize_zip': bench_normalize_zip,
+    'normalize_zips': bench_normalize_zips,
+    'zip_state_mismatches': bench_zip_state_mismatches,
+    'split_name': bench_split_name,
+    'split_names': bench_split_names,
+    'parse_date': bench_parse_date,
+    'parse_date_column': bench_parse_date_column,
+    'format_phone_number': bench_format_phone_number,
+    'normalize_phones': bench_normalize_phones,
+    'map_professions': bench_map_professions,
+    'vlookup': bench_vlookup,
+    'vlookup_column': bench_vlookup_column,
+    'normalize_file': bench_normalize_file,
+    }
+
+
+def run_benchmark(name, df, context, repeat):
+    # Best of repeat runs, reported as seconds and rows/sec
+    timed, rows = BENCHMARKS[name](df, context)
+    best = float('inf')
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        timed()
+        best = min(best, time.perf_counter() - start_time)
+    return {'benchmark': name, 'rows': rows, 'seconds': best, 'rows_per_second': rows / best if best > 0 else float('inf')}
+
+def compare_to_baseline(results, baselines, threshold):
+    # Results more than threshold (a fraction) slower than their baseline rows/sec
+    regressions = []
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        if baseline and result['rows_per_second'] < baseline * (1 - threshold):
+            regressions.append((key, baseline, result['rows_per_second']))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the lead normalization pipeline.')
+    parser.add_argument('--sizes', nargs='+', choices=list(DATASET_SIZES), default=['10k'], help='dataset sizes to run')
+    parser.add_argument('--bench', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS), help='benchmarks to run (default: all)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the synthetic exports')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark; the best time is kept')
+    parser.add_argument('--per-value-limit', type=int, default=100_000, help='rows used by the per-value benchmarks')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'leads_bench'), help='where generated datasets are kept')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_FILE, help='baseline file (rows/sec per benchmark and size)')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--require-baseline', action='store_true', help='exit 1 when a benchmark has no stored baseline to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown versus baseline before failing (0.25 = 25%%)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Benchmark outputs and the lookup table go to a scratch "desktop" so nothing real is touched
+    normalizer.path_to_desktop = os.path.join(args.data_dir, 'desktop') + os.sep
+    normalizer.ensure_dir_exists(normalizer.path_to_desktop)
+
+    results = {}
+    for size in args.sizes:
+        df, input_file = load_dataset(DATASET_SIZES[size], args.seed, args.data_dir)
+
+        lookup_file = f'accounts_{size}.csv'
+        accounts = df[['Email']].drop_duplicates().head(50_000)
+        accounts.assign(AccountId=[f'001{i:012d}' for i in range(len(accounts))]).to_csv(normalizer.path_to_desktop + lookup_file, index=False)
+
+        context = {'per_value_limit': args.per_value_limit, 'lookup_file': lookup_file, 'input_file': input_file}
+        for name in args.bench:
+            result = run_benchmark(name, df, context, args.repeat)
+            results[f'{name}@{size}'] = result
+            print(f"[i] {name.upper()} @ {size}: {result['rows']} ROWS IN {round(result['seconds'], 3)} SECONDS ({round(result['rows_per_second'])} ROWS/SEC)")
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            baselines = json.load(baseline_file)
+
+    regressions = compare_to_baseline(results, baselines, args.threshold)
+    for key, baseline, current in regressions:
+        print(f'[!] REGRESSION {key}: {round(current)} ROWS/SEC vs BASELINE {round(baseline)} ROWS/SEC')
+
+    # Without a baseline a benchmark cannot regress; say so rather than passing silently
+    missing = [key for key in results if not baselines.get(key)]
+    if missing and not args.save_baseline:
+        print(f"[!] NO BASELINE IN {args.baseline} FOR: {', '.join(missing)} (run with --save-baseline on this machine first)")
+
+    if args.save_baseline:
+        baselines.update({key: result['rows_per_second'] for key, result in results.items()})
+        with open(args.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(baselines, baseline_file, indent=2, sort_keys=True)
+        print(f'[+] BASELINE SAVED TO: {args.baseline}')
+
+    return 1 if regressions or (args.require_baseline and missing and not args.save_baseline) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,63 +2,94 @@
 '''
 SOP Steps:
 
-1. Save the file you want to normalize to the desktop
-2. Modify the string on line 53 to match the exact formatting and file name of the file you saved to the desktop
-3. Do the same in the fs_norm file on line 12
-3. Run the script by running the following commands in the terminal: 
+1. Save the file(s) you want to normalize to the desktop
+2. Run the script by running the following commands in the terminal:
     a. Make sure you're in the right folder with:
         cd /Users/KSPA/Desktop/LEAD-NORM/
-    b. Run the script with:
-        python3 leads_norm.py
-4. The script will normalize the file on the desktop and save it to the desktop with the starting name prepended with 'normalized_'
+    b. Run the script with the file name(s), paths or glob patterns to normalize:
+        python3 leads_norm.py event-leads.xlsx
+       or, for a batch of exports across several worker processes:
+        python3 leads_norm.py "~/Desktop/*-leads.xlsx" --workers 4
+3. The script will normalize each file and save it to the LEAD-NORM folder on the desktop with '_normalized' appended to its name
+4. Files that have not changed since their last run are skipped, and re-sent exports that only add rows have just the new rows normalized (use --no-cache to reprocess everything)
+
+Run `python3 leads_norm.py --help` for all options.
 '''
 
 # =========================== IMPORTS ===========================
 
+# Only the standard library is imported up front; pandas and the normalizer load inside main() so --help stays instant
+import argparse
 import sys
-import site
-sys.path.extend(site.getsitepackages())
 
-import gc # garbage collection for freeing up memory
-import pandas as pd 
-from fs_norm import FSNormalizer
-from leads_norm_functions import *
-# ///////// end csv imports ///////////
 
-import sys
-import time
-from datetime import datetime
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Normalize event lead exports.')
+    parser.add_argument('inputs', nargs='+', help='input files, paths or glob patterns; bare names are looked up on the desktop')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes for multi-file batches (default: one per CPU)')
+    parser.add_argument('--chunksize', type=int, default=None, help='stream each input in chunks of this many rows (chunked outputs are not cached, so their next run reprocesses them in full)')
+    parser.add_argument('--format', dest='output_format', choices=['xlsx', 'csv', 'parquet'], default='xlsx', help='output file format')
+    parser.add_argument('--rules', metavar='PATH', help='vendor rule spec (.json, or .yaml with PyYAML installed) mapping columns, value maps and derived fields')
+    parser.add_argument('--compact', action='store_true', help='keep low-cardinality columns as categoricals and other text as Arrow strings, and report memory per column')
+    parser.add_argument('--dedupe', action='store_true', help='merge duplicate leads across the normalized outputs into deduped_leads, with a dedupe_report of every cluster')
+    parser.add_argument('--no-cache', action='store_true', help='reprocess every input instead of reusing cached results')
+    parser.add_argument('--profile-startup', action='store_true', help='report time spent importing versus processing')
+    parser.add_argument('--report', metavar='PATH', help='write a JSON run report with per-stage time, rows/sec and peak memory for every file')
+    parser.add_argument('--cprofile', metavar='PATH', help='dump cProfile stats for the run (worker processes are not profiled; use -j 1 for a full profile)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print(f'// RUNNING [EVENT LEADS NORMALIZATION V.001] //')
+
+    # ========================= INITIALIZATION =========================
+
+    from run_report import RunReport
+    run_report = RunReport()
 
-print(f'// RUNNING [EVENT LEADS NORMALIZATION V.001] //')
+    # Heavy imports; leads_norm_functions builds the one FSNormalizer (and its mapping tables) this run uses
+    with run_report.stage('imports') as imports:
+        from leads_norm_functions import normalizer, normalize_files_parallel
+        rules = normalizer.load_rules(args.rules) if args.rules else None
+    print(f"[+] INITIALIZATION COMPLETE: {round(imports['seconds'], 2)} SECONDS")
 
-# ========================= INITIALIZATION =========================
+    # ========================= LEAD NORMALIZATION =========================
 
-# We want to time our operations, so we start our timer
-start_time = time.time()
-total_timer_start = time.time()
+    profiler = None
+    if args.cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
 
-normalizer = FSNormalizer()
-all_errors = {}
-desktop_file_name_1 = 'event-leads.xlsx'
-desktop_file_name_2 = None
-desktop_file_names = [desktop_file_name_1, desktop_file_name_2] if desktop_file_name_2 is not None else [desktop_file_name_1]
+    with run_report.stage('processing') as processing:
+        results = normalize_files_parallel(args.inputs, max_workers=args.workers, chunksize=args.chunksize,
+                                           output_format=args.output_format, use_cache=not args.no_cache,
+                                           track_memory=bool(args.report), rules=rules,
+                                           compact=args.compact, dedupe=args.dedupe)
+        processing['rows'] = sum(result['rows'] for result in results)
 
-# Print the action duration and reset our timer
-end_time = time.time()
-print(f'[+] INITIALIZATION COMPLETE: {round((end_time - start_time), 2)} SECONDS')
-start_time = time.time()
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.cprofile)
+        print(f'[i] CPROFILE STATS WRITTEN TO: {args.cprofile}')
 
-# ========================= LEAD NORMALIZATION =========================
+    if args.profile_startup:
+        print(f"[i] STARTUP PROFILE: IMPORTS {round(imports['seconds'], 2)} SECONDS | PROCESSING {round(processing['seconds'], 2)} SECONDS")
 
-# Normalize the desktop file
-normalize_desktop_file(desktop_file_names)
+    if args.report:
+        for result in results:
+            print(f"[i] {result['input']}")
+            RunReport.print_stages(result['stages'])
+        run_report.write_json(args.report, files=results)
 
-date = datetime.today().strftime("%Y-%m-%d")
-start_time = time.time()
+    print(f'================ TOTAL RUN TIME =================')
+    print(f"{round(imports['seconds'] + processing['seconds'], 2)} SECONDS")
+    print(f'==================================================')
 
-total_timer_end = time.time()
-print(f'================ TOTAL RUN TIME =================')
-print(f'{round((total_timer_end - total_timer_start), 2)} SECONDS')
-print(f'==================================================')
+    return 1 if any(result['status'] == 'error' for result in results) else 0
 
 
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,53 +1,288 @@
 import os
 import csv
+import json
+import hashlib
+import glob
 import io
+import numpy as np
 import pandas as pd
+import openpyxl
 import traceback
 import re
 import math
 import time
 from datetime import datetime, timedelta
-from itertools import islice
+from itertools import islice, count
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from fs_norm import FSNormalizer as normalizer
+from run_report import RunReport
 
 normalizer = normalizer()
 
 
 # =========================== CSV functions ===========================
 
-# Desktop file retrieval (local file)
-def get_desktop_file(filename):
+# Desktop file location (local file)
+def get_desktop_path(filename):
     desktop_path = os.path.join(os.path.expanduser('~'), 'Desktop')
     file_path = os.path.join(desktop_path, filename)
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"The file {filename} was not found on the desktop.")
+    return file_path
+
+# Desktop file retrieval (local file)
+def get_desktop_file(filename):
+    file_path = get_desktop_path(filename)
     with open(file_path, 'rb') as file:
         file_content = file.read()
 
     return filename, file_content
 
+# Expand a list of names, paths or glob patterns into input paths; bare names resolve to the desktop
+def resolve_input_files(inputs):
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    file_paths = []
+    for item in inputs:
+        expanded = os.path.expanduser(item)
+        if glob.has_magic(expanded):
+            file_paths.extend(sorted(glob.glob(expanded)))
+        elif os.path.exists(expanded):
+            file_paths.append(expanded)
+        else:
+            file_paths.append(get_desktop_path(item))
+    return file_paths
+
+# =========================== Result cache ===========================
+
+# Persistent cache of processed inputs, kept next to the normalized outputs
+NORM_CACHE_FILE = 'norm_cache.json'
+DEDUPED_LEADS_FILE = 'deduped_leads'
+DEDUPE_REPORT_FILE = 'dedupe_report'
+
+def norm_cache_path():
+    return f'{normalizer.path_to_desktop}{normalizer.processing_subfolder}{NORM_CACHE_FILE}'
+
+def load_norm_cache(cache_path):
+    if not os.path.exists(cache_path):
+        return {}
+    with open(cache_path, 'r', encoding='utf-8') as cache_file:
+        return json.load(cache_file)
+
+def save_norm_cache(cache, cache_path):
+    # Write to a temp file and swap it in so a crash never leaves a truncated cache
+    normalizer.ensure_dir_exists(cache_path)
+    temp_path = f'{cache_path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as cache_file:
+        json.dump(cache, cache_file, indent=2)
+    os.replace(temp_path, cache_path)
+
+# Function to hash a file's bytes without loading it all at once
+def file_content_hash(file_path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Function to hash the first row_count rows of an input, given its per-row hashes
+def rows_prefix_hash(row_hashes, row_count):
+    return hashlib.sha256(row_hashes[:row_count].tobytes()).hexdigest()
+
+# Function to count the data rows of a CSV output (csv.reader, so quoted line breaks are not counted as rows)
+def count_csv_rows(file_path):
+    with open(file_path, 'r', newline='', encoding='utf-8') as csv_file:
+        return max(sum(1 for _ in csv.reader(csv_file)) - 1, 0)
+
+def read_normalized_output(file_path, output_format):
+    if output_format == 'csv':
+        return pd.read_csv(file_path, dtype=str)
+    elif output_format == 'parquet':
+        return pd.read_parquet(file_path)
+    return pd.read_excel(file_path, dtype=str)
+
+# Normalize a file through the cache: when it extends an input processed before, only the appended rows are normalized
+def normalize_with_cache(file_path, output_filename, output_format, cache, content_hash, rules_version, rules=None):
+    output_path = f'{normalizer.path_to_desktop}{normalizer.processing_subfolder}{output_filename}'
+    normalizer.ensure_dir_exists(output_path)
+
+    with normalizer.stage('read') as record:
+        df = normalizer.read_input(file_path, rules)
+        record['rows'] = len(df)
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+    # Largest earlier input (same rules and format, output still on disk) whose rows are a prefix of this one
+    base = None
+    for entry in cache.values():
+        if (entry['rules_version'] == rules_version and entry['output_format'] == output_format
+                and entry['rows'] <= len(df) and os.path.exists(entry['output'])
+                and (base is None or entry['rows'] > base['rows'])
+                and rows_prefix_hash(row_hashes, entry['rows']) == entry['rows_hash']):
+            base = entry
+
+    # The previous output must still hold exactly the cached rows (it may have been edited or rewritten since)
+    previous = None
+    append_in_place = base is not None and output_format == 'csv' and base['output'] == output_path
+    if append_in_place:
+        try:
+            previous_rows = count_csv_rows(output_path)
+        except Exception:
+            previous_rows = None
+        if previous_rows != base['rows']:
+            base = None
+    elif base is not None:
+        try:
+            previous = read_normalized_output(base['output'], output_format)
+        except Exception:
+            previous = None
+        if previous is None or len(previous) != base['rows']:
+            base = None
+
+    if base is None:
+        normalized = normalizer.normalize_data(df, rules)
+        normalizer.write_output(normalized, output_path, output_format)
+    else:
+        new_rows = normalizer.normalize_data(df.iloc[base['rows']:].copy(), rules)
+        if append_in_place:
+            # CSV output of the same input, checked above to hold exactly the cached rows: append in place
+            new_rows.to_csv(output_path, mode='a', header=False, index=False)
+        else:
+            normalizer.write_output(pd.concat([previous, new_rows], ignore_index=True), output_path, output_format)
+        print(f"[i] {len(new_rows)} NEW ROWS MERGED INTO {base['rows']} PREVIOUSLY NORMALIZED ROWS")
+    print(f"[+] SUCCESS! Output written to: {output_path}")
+
+    return {'content_hash': content_hash, 'rules_version': rules_version, 'rows': len(df),
+            'rows_hash': rows_prefix_hash(row_hashes, len(df)), 'output': output_path, 'output_format': output_format}
+
+# Normalize a single input path straight from disk and return a result summary for it
+# skip_normalized skips names containing 'norm' (earlier outputs saved next to the inputs on the desktop)
+def normalize_input_file(file_path, chunksize=None, output_format='xlsx', cache=None, track_memory=False, rules=None, compact=False, skip_normalized=True):
+    filename = os.path.basename(file_path)
+    result = {'input': file_path, 'output': None, 'status': 'skipped', 'rows': 0, 'seconds': 0.0, 'error': None, 'cache_entry': None, 'stages': [], 'unmapped_professions': {}, 'memory': {}}
+    if skip_normalized and 'norm' in filename.lower():
+        return result
+
+    print(f'PROCESSING {filename}...')
+    start_time = time.time()
+
+    # Per-stage timings for this file end up in result['stages']
+    normalizer.report = RunReport(track_memory=track_memory)
+    normalizer.unmapped_professions = {}
+    normalizer.compact = compact
+    normalizer.memory_report = {}
+
+    # Create an output filename
+    output_string = filename.split('.')[0]
+    output_filename = f'{output_string}_normalized.{output_format}'
+    result['output'] = f'{normalizer.path_to_desktop}{normalizer.processing_subfolder}{output_filename}'
+
+    # Use the normalizer to process the file (streamed in row chunks when chunksize is set)
+    try:
+        if cache is not None:
+            content_hash = file_content_hash(file_path)
+            rules_version = normalizer.rules_fingerprint(rules)
+            unchanged = [entry for entry in cache.values() if entry['content_hash'] == content_hash and entry['rules_version'] == rules_version
+                         and entry['output_format'] == output_format and os.path.exists(entry['output'])]
+
+        if cache is not None and unchanged:
+            result.update(status='cached', output=unchanged[0]['output'], rows=unchanged[0]['rows'], cache_entry=unchanged[0])
+            print(f"[i] {filename} UNCHANGED, USING {unchanged[0]['output']}")
+        elif chunksize:
+            result['rows'] = normalizer.normalize_file_chunked(file_path, output_filename, chunksize=chunksize, raise_errors=True, rules=rules)
+            result['status'] = 'ok'
+        elif cache is not None:
+            result['cache_entry'] = normalize_with_cache(file_path, output_filename, output_format, cache, content_hash, rules_version, rules)
+            result['rows'] = result['cache_entry']['rows']
+            result['status'] = 'ok'
+        else:
+            result['rows'] = len(normalizer.normalize_file(file_path, output_filename, raise_errors=True, output_format=output_format, rules=rules))
+            result['status'] = 'ok'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+        print(f"[!] {filename} FAILED: {str(e)}")
+
+    result['stages'] = normalizer.report.summary()
+    normalizer.report.close()
+    normalizer.report = None
+
+    # Profession values no mapping (or close match) covers, so the substitutions table can be extended
+    result['unmapped_professions'] = normalizer.unmapped_professions
+    if result['unmapped_professions']:
+        unmapped = sorted(result['unmapped_professions'].items(), key=lambda item: -item[1])
+        print(f"[!] {len(unmapped)} UNMAPPED PROFESSION VALUE(S): " + ', '.join(f"'{value}' ({rows} ROWS)" for value, rows in unmapped[:10]))
+
+    # Per-column memory before and after compaction (compact mode only)
+    result['memory'] = normalizer.memory_report
+    for column, usage in result['memory'].items():
+        print(f"[i] MEMORY {column}: {round(usage['bytes_before'] / 1e6, 2)} MB ({usage['dtype_before']}) -> "
+              f"{round(usage['bytes_after'] / 1e6, 2)} MB ({usage['dtype_after']})")
+
+    result['seconds'] = round(time.time() - start_time, 2)
+    return result
+
 # Desktop file processing
-def normalize_desktop_file(filenames):
-    for filename in filenames:
-        filename, data = get_desktop_file(filename)
-        print(f'PROCESSING {filename}...')
-        normalized_df = None
-
-        if 'norm' not in filename.lower():
-            # Create a temporary input file
-            temp_input = f'temp_input_{filename}'
-            with open(temp_input, 'wb') as f:
-                f.write(data)
-            
-            # Create an output filename
-            output_string = filename.split('.')[0]
-            output_filename = f'{output_string}_normalized.xlsx'
-
-            # Use the normalizer to process the file
-            normalizer.normalize_file(temp_input, output_filename)
-
-            # Clean up temporary files
-            os.remove(temp_input)
+def normalize_desktop_file(filenames, chunksize=None, output_format='xlsx', use_cache=False, track_memory=False, rules=None, compact=False, dedupe=False):
+    return normalize_files_parallel(filenames, max_workers=1, chunksize=chunksize, output_format=output_format, use_cache=use_cache,
+                                    track_memory=track_memory, rules=rules, compact=compact, dedupe=dedupe)
+
+# Batch processing: normalize many exports across a process pool, one file per worker task
+def normalize_files_parallel(inputs, max_workers=None, chunksize=None, output_format='xlsx', use_cache=False, track_memory=False, rules=None, compact=False,
+                             dedupe=False):
+    file_paths = resolve_input_files(inputs)
+    if not file_paths:
+        return []
+
+    # Workers only read the cache; new entries are merged and saved here once all files are done
+    cache = load_norm_cache(norm_cache_path()) if use_cache else None
+    # Runs without the cache (and chunked runs) still rewrite outputs, so stale entries must be dropped either way
+    cache_entries = cache if cache is not None else load_norm_cache(norm_cache_path())
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(file_paths))
+    if max_workers == 1:
+        results = [normalize_input_file(file_path, chunksize=chunksize, output_format=output_format, cache=cache, track_memory=track_memory, rules=rules, compact=compact)
+                   for file_path in file_paths]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(normalize_input_file, file_paths, [chunksize] * len(file_paths),
+                                        [output_format] * len(file_paths), [cache] * len(file_paths), [track_memory] * len(file_paths),
+                                        [rules] * len(file_paths), [compact] * len(file_paths)))
+
+    for result in results:
+        print(f"[i] {os.path.basename(result['input'])}: {result['status'].upper()} - {result['rows']} ROWS IN {result['seconds']} SECONDS")
+
+    # An output rewritten by this run no longer matches any entry that points at it
+    rewritten = {result['output'] for result in results if result['status'] == 'ok'}
+    stale = [key for key, entry in cache_entries.items() if entry['output'] in rewritten]
+    for key in stale:
+        del cache_entries[key]
+    for result in results:
+        if result['status'] == 'ok' and result['cache_entry'] is not None:
+            cache_entries[os.path.abspath(result['input'])] = result['cache_entry']
+    if cache is not None or stale:
+        save_norm_cache(cache_entries, norm_cache_path())
+
+    if dedupe:
+        dedupe_outputs(results, output_format, rules)
+
+    return results
+
+# Dedupe the normalized outputs of a batch across files; survivors and the cluster report are written next to them
+def dedupe_outputs(results, output_format='xlsx', rules=None):
+    outputs = {os.path.basename(result['input']): read_normalized_output(result['output'], output_format)
+               for result in results if result['status'] in ('ok', 'cached')}
+    if not outputs:
+        return None
+
+    survivors, report = dedupe_leads(outputs, rules=rules)
+    output_dir = f'{normalizer.path_to_desktop}{normalizer.processing_subfolder}'
+    survivors_path = f'{output_dir}{DEDUPED_LEADS_FILE}.{output_format}'
+    report_path = f'{output_dir}{DEDUPE_REPORT_FILE}.{output_format}'
+    normalizer.write_output(survivors, survivors_path, output_format)
+    normalizer.write_output(report, report_path, output_format)
+    print(f"[+] DEDUPED LEADS WRITTEN TO: {survivors_path} (CLUSTER REPORT: {report_path})")
+    return survivors_path, report_path
 
 def read_spreadsheet(file_content, file_type):
     if file_type == 'csv':
@@ -58,27 +293,9 @@ def read_spreadsheet(file_content, file_type):
         raise ValueError(f"Unsupported file format: {file_type}. Please use CSV or XLSX.")
     return df
 
+# One name splitter for the whole tool: same rules as FSNormalizer.split_names (use that for whole columns)
 def split_name(full_name):
-    # List of common titles
-    titles = ['Mr', 'Mrs', 'Ms', 'Miss', 'Dr', 'Prof']
-    
-    # Remove any periods and split the name
-    name_parts = re.sub(r'\.', '', full_name).split()
-    
-    # Check if the first part is a title
-    if name_parts[0] in titles:
-        title = name_parts.pop(0)
-    else:
-        title = ''
-    
-    # If there's only one part left, it's treated as the last name
-    if len(name_parts) == 1:
-        return '', name_parts[0], title
-    
-    # Otherwise, the last part is the last name, and everything else is the first name
-    last_name = name_parts.pop()
-    first_name = ' '.join(name_parts)
-    
+    first_name, last_name = normalizer.split_name(full_name)
     return first_name, last_name
 
 
@@ -108,40 +325,200 @@ def parse_date(date_input):
     
     raise ValueError(f"Unsupported date type: {type(date_input)}")
 
+# Date formats tried by parse_date_column, and the dominant format detected per cache key
+DATE_FORMATS = ("%m-%d-%Y", "%Y-%m-%d")
+date_format_cache = {}
+
+# Function to pick the format that parses the most values in a sample of date strings
+def infer_date_format(date_strings, formats=DATE_FORMATS, sample_size=1000):
+    sample = date_strings.dropna().head(sample_size)
+    if sample.empty:
+        return formats[0]
+    parsed_counts = {fmt: pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum() for fmt in formats}
+    return max(formats, key=parsed_counts.get)
+
+# Function to parse a whole column of dates at once
+def parse_date_column(dates, formats=DATE_FORMATS, cache_key=None):
+    """
+    Column-level parse_date: detect the dominant format once, parse in bulk, and only fall back
+    to the other formats (then parse_date per value) for the rows that are left over.
+
+    :param dates: Series of date strings (mm-dd-yyyy or yyyy-mm-dd, optionally with a time), Timestamps or datetimes
+    :param formats: strptime formats to try
+    :param cache_key: reuse the format detected for this key (e.g. a column name across chunks) instead of detecting it again
+    :return: (datetime64 Series, boolean Series marking non-empty values that could not be parsed)
+    """
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates, pd.Series(False, index=dates.index)
+
+    # Timestamps and datetimes pass through with their time, as in parse_date; only text has a time component dropped
+    present = dates.notna().to_numpy()
+    values = dates[present]
+    if pd.api.types.infer_dtype(values, skipna=True) == 'string':
+        is_datetime = np.zeros(len(values), dtype=bool)
+    else:
+        is_datetime = values.map(lambda value: isinstance(value, datetime)).to_numpy(dtype=bool)
+    date_strings = values[~is_datetime].astype(str).str.split(n=1).str[0]
+
+    if cache_key is not None and cache_key in date_format_cache:
+        dominant_format = date_format_cache[cache_key]
+    else:
+        dominant_format = infer_date_format(date_strings, formats)
+        if cache_key is not None:
+            date_format_cache[cache_key] = dominant_format
+
+    # Bulk parse with the dominant format, then with each remaining format on the leftovers only
+    parsed = pd.to_datetime(date_strings, format=dominant_format, errors='coerce')
+    for fmt in formats:
+        leftovers = parsed.isna()
+        if fmt == dominant_format or not leftovers.any():
+            continue
+        parsed[leftovers] = pd.to_datetime(date_strings[leftovers], format=fmt, errors='coerce').to_numpy()
+
+    # Per-value fallback for whatever is still unparsed
+    def parse_or_nat(date_input):
+        try:
+            return parse_date(date_input)
+        except (ValueError, IndexError):
+            return pd.NaT
+
+    leftovers = parsed.isna().to_numpy()
+    if leftovers.any():
+        parsed[leftovers] = pd.to_datetime([parse_or_nat(value) for value in values[~is_datetime][leftovers]])
+
+    parsed_values = np.empty(len(values), dtype='datetime64[ns]')
+    parsed_values[~is_datetime] = parsed.to_numpy(dtype='datetime64[ns]')
+    parsed_values[is_datetime] = pd.to_datetime(values[is_datetime]).to_numpy(dtype='datetime64[ns]')
+
+    result = pd.Series(pd.NaT, index=dates.index, dtype='datetime64[ns]', name=dates.name)
+    result[present] = parsed_values
+    return result, pd.Series(present, index=dates.index) & result.isna()
+
 # Function to return numerals from phone numbers; EX '5124592222' instead of '(512) 459-2222'
+# (see FSNormalizer.normalize_phones for whole columns)
 def format_phone_number(s):
-    return ''.join(c for c in s if c.isdigit())
+    if pd.isna(s):
+        return ''
+    if isinstance(s, float) and s.is_integer():
+        s = int(s)
+    return ''.join(c for c in str(s) if c.isdigit())
 
-def bulk_check_leads(sf, unprocessed_leads):
+# =========================== Account matching ===========================
 
-    def is_valid_email(email):
-        if isinstance(email, str):
-            return email.strip() != '' and email.lower() != 'nan'
-        return False
-    
-    # Extract all email addresses
-    emails = [lead["account_email"] for lead in unprocessed_leads if is_valid_email(lead["account_email"])]
-
-    # Perform a bulk query to check which accounts exist
-    # [ ] ensure that the account type is distro FS || "MBL_Actual_Lead_Source_Name__c": "Fullscript (FS)"
-    query = f"""
-            SELECT MBL_User_Email__c, Id 
-            FROM Account 
-            WHERE MBL_User_Email__c IN {tuple(emails)} 
-            AND MBL_Account_Channel__c = 'Distributor US'
-            AND MBL_Distributor_Accounts__c = 'FullScript (FS)'
-            """
-    existing_accounts = sf.bulk.Account.query(query)
-
-    # Create a dictionary mapping emails to account IDs
-    email_to_account_id = {account['MBL_User_Email__c']: account['Id'] for account in existing_accounts}
+# SOQL statements are capped at 100,000 characters; leave room for the rest of the query
+SOQL_MAX_IN_CLAUSE_LENGTH = 99000
+
+# Client cache_key -> {normalized email: (account ID or None, expiry timestamp)}, shared across bulk_check_leads calls.
+# Keyed by client so answers from one org, query or stand-in are never reused for another.
+account_id_cache = {}
+account_id_cache_lock = threading.Lock()
+in_memory_client_ids = count()
+
+# Function to normalize an email for matching; returns None for blanks and 'nan'
+def normalize_email(email):
+    if isinstance(email, str):
+        email = email.strip().lower()
+        if email != '' and email != 'nan':
+            return email
+    return None
+
+# Function to split emails into batches bounded by count and by IN clause length
+def batch_emails(emails, batch_size=200, max_length=SOQL_MAX_IN_CLAUSE_LENGTH):
+    batch = []
+    batch_length = 0
+    for email in emails:
+        quoted_length = len(email) + 4
+        if batch and (len(batch) >= batch_size or batch_length + quoted_length > max_length):
+            yield batch
+            batch = []
+            batch_length = 0
+        batch.append(email)
+        batch_length += quoted_length
+    if batch:
+        yield batch
+
+# Account lookup client backed by simple_salesforce's bulk API
+class SalesforceAccountClient:
+    def __init__(self, sf):
+        self.sf = sf
+        # Same org (instance URL) and same query -> same answers, so new clients for one org share cached results
+        self.cache_key = ('salesforce', getattr(sf, 'base_url', None) or id(sf))
+
+    def query_account_ids(self, emails):
+        email_list = ', '.join("'" + email.replace('\\', '\\\\').replace("'", "\\'") + "'" for email in emails)
+        # [ ] ensure that the account type is distro FS || "MBL_Actual_Lead_Source_Name__c": "Fullscript (FS)"
+        query = f"""
+                SELECT MBL_User_Email__c, Id 
+                FROM Account 
+                WHERE MBL_User_Email__c IN ({email_list}) 
+                AND MBL_Account_Channel__c = 'Distributor US'
+                AND MBL_Distributor_Accounts__c = 'FullScript (FS)'
+                """
+        existing_accounts = self.sf.bulk.Account.query(query)
+        return {normalize_email(account['MBL_User_Email__c']): account['Id'] for account in existing_accounts}
+
+# In-memory stand-in for SalesforceAccountClient, for offline runs and throughput testing
+class InMemoryAccountClient:
+    def __init__(self, accounts, latency=0.0):
+        self.accounts = {normalize_email(email): account_id for email, account_id in accounts.items()}
+        self.latency = latency
+        self.queries = 0
+        self.cache_key = ('in-memory', next(in_memory_client_ids))
+        self.lock = threading.Lock()
+
+    def query_account_ids(self, emails):
+        with self.lock:
+            self.queries += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return {email: self.accounts[email] for email in emails if email in self.accounts}
+
+# Function to map normalized emails to account IDs: TTL cache first, then concurrent batched queries for the rest
+def lookup_account_ids(emails, client, batch_size=200, max_workers=4, cache_ttl=3600):
+    email_to_account_id = {}
+    emails_to_query = []
+
+    now = time.time()
+    with account_id_cache_lock:
+        client_cache = account_id_cache.setdefault(getattr(client, 'cache_key', ('client', id(client))), {})
+        for email in emails:
+            cached = client_cache.get(email)
+            if cached is not None and cached[1] > now:
+                if cached[0] is not None:
+                    email_to_account_id[email] = cached[0]
+            else:
+                emails_to_query.append(email)
+
+    batches = list(batch_emails(emails_to_query, batch_size))
+    if not batches:
+        return email_to_account_id
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        for batch, found in zip(batches, executor.map(client.query_account_ids, batches)):
+            expires_at = time.time() + cache_ttl
+            with account_id_cache_lock:
+                for email in batch:
+                    client_cache[email] = (found.get(email), expires_at)
+            email_to_account_id.update(found)
+
+    return email_to_account_id
+
+def bulk_check_leads(sf, unprocessed_leads, client=None, batch_size=200, max_workers=4, cache_ttl=3600):
+    if client is None:
+        client = SalesforceAccountClient(sf)
+
+    # Extract all email addresses, normalized and deduplicated
+    emails = list(dict.fromkeys(email for email in (normalize_email(lead["account_email"]) for lead in unprocessed_leads) if email))
+
+    # Check which accounts exist, in size-bounded batches run concurrently
+    email_to_account_id = lookup_account_ids(emails, client, batch_size=batch_size, max_workers=max_workers, cache_ttl=cache_ttl)
 
     # Separate orders into existing and non-existing accounts
     existing_leads = []
     non_existing_leads = []
 
     for lead in unprocessed_leads:
-        email = lead["account_email"]
+        email = normalize_email(lead["account_email"])
         if email in email_to_account_id:
             lead['account_id'] = email_to_account_id[email]
             existing_leads.append(lead)
@@ -150,45 +527,194 @@ def bulk_check_leads(sf, unprocessed_leads):
 
     return existing_leads, non_existing_leads
 
-def create_receipt_xlsx(sf_objects, filename):
-    flattened_data = []
-    
+# =========================== Lead deduplication ===========================
+
+# Function to build the hash keys used to link duplicate leads; missing keys are NaN and never match.
+# Returns (email, [phone, name_zip]): an email identifies a lead, the other keys only link rows whose emails agree.
+# Columns are looked up under the rule plan's output names; a key whose columns are missing is skipped.
+def dedupe_keys(df, rules=None):
+    plan = normalizer.compile_rules(rules)
+    column = lambda name: df.get(plan.output_name(name))
+    blank_key = pd.Series(pd.NA, index=df.index, dtype='string')
+
+    email = column('Email')
+    if email is None:
+        email = blank_key
+    email = email.astype('string').str.strip().str.lower()
+    email = email.mask(email.isin(['', 'nan']))
+
+    links = []
+    if column('Phone') is not None:
+        phone, phone_valid = normalizer.normalize_phones(column('Phone'))
+        links.append(phone.where(phone_valid))
+
+    # Blocking key: last name + 5-digit ZIP picks the candidates, which match on first name so relatives at one address stay separate
+    name_columns = [column('Last Name'), column('PostalCode'), column('First Name')]
+    if all(values is not None for values in name_columns):
+        last_name, zip_code, first_name = (values.astype('string').str.strip() for values in name_columns)
+        last_name, first_name, zip_code = last_name.str.lower(), first_name.str.lower(), zip_code.str[:5]
+        name_zip = last_name + '|' + zip_code + '|' + first_name
+        links.append(name_zip.mask((last_name == '') | (zip_code == '') | (first_name == '') | zip_code.isin(['nan', '00nan'])))
+
+    return email, links
+
+# Function to assign every row the position of the first row in its duplicate cluster (connected components over shared keys)
+def cluster_duplicates(keys, row_count):
+    labels = np.arange(row_count)
+    key_codes = [pd.factorize(key.to_numpy(), use_na_sentinel=True)[0] for key in keys]
+
+    changed = True
+    while changed:
+        changed = False
+        for codes in key_codes:
+            has_key = codes >= 0
+            if not has_key.any():
+                continue
+            group_min = pd.Series(labels[has_key]).groupby(codes[has_key]).transform('min').to_numpy()
+            if (group_min < labels[has_key]).any():
+                labels[has_key] = np.minimum(labels[has_key], group_min)
+                changed = True
+        # Pointer jumping: every label is a row in the same cluster, so follow it to collapse chains quickly
+        labels = labels[labels]
+
+    return labels
+
+# Function to cluster leads by email, letting phone / name+ZIP links only join rows that have no email of their own.
+# Two rows with different non-blank emails are never joined (e.g. two people behind one front-desk phone).
+def link_duplicates(email, links, row_count):
+    email = email.reset_index(drop=True)
+    has_email = email.notna().to_numpy()
+    email_labels = cluster_duplicates([email], row_count)
+
+    usable, targets = [], []
+    for key in links:
+        key = key.reset_index(drop=True)
+        # A key shared by rows with different emails is ambiguous: it links nothing
+        with_email = key.notna() & email.notna()
+        emails_per_key = email[with_email].groupby(key[with_email]).nunique()
+        key = key.mask(key.isin(emails_per_key.index[emails_per_key > 1]))
+        # The one email cluster behind each remaining key, if any
+        cluster_per_key = pd.Series(email_labels[with_email.to_numpy()]).groupby(key[with_email].to_numpy()).min()
+        targets.append(key.map(cluster_per_key).to_numpy(dtype=float))
+        usable.append(key.mask(has_email))
+
+    # Rows without an email join each other through the keys, then (as a group) the single email cluster they point at
+    labels = np.where(has_email, email_labels, cluster_duplicates(usable, row_count))
+    if targets:
+        components = np.tile(labels, len(targets))
+        pairs = pd.DataFrame({'component': components, 'target': np.concatenate(targets)})
+        pairs = pairs[~np.tile(has_email, len(targets)) & pairs['target'].notna()]
+        per_component = pairs.groupby('component')['target'].agg(['nunique', 'min'])
+        attach = per_component.loc[per_component['nunique'] == 1, 'min'].astype(int)
+        attached = np.isin(labels, attach.index) & ~has_email
+        labels[attached] = attach.reindex(labels[attached]).to_numpy()
+
+    # Label every row with the first row of its cluster
+    return pd.Series(np.arange(row_count)).groupby(labels).transform('min').to_numpy()
+
+# Deduplicate normalized leads from one DataFrame or a {file name: DataFrame} batch
+def dedupe_leads(leads, source_column='source_file', rules=None):
+    """
+    Cluster duplicate leads by normalized email, digits-only phone, or last name + ZIP (+ first name),
+    using hash indexes only (no pairwise comparison). Phone and name + ZIP never join rows whose
+    non-blank emails differ.
+
+    :param leads: normalized DataFrame, or dict of file name -> normalized DataFrame to dedupe across files
+    :param source_column: column recording the originating file when a dict is given
+    :param rules: vendor rule spec the leads were normalized with (renamed output columns)
+    :return: (survivors DataFrame with one merged record per cluster, report DataFrame listing the rows of each duplicate cluster)
+    """
+    if isinstance(leads, dict):
+        leads = pd.concat([df.assign(**{source_column: name}) for name, df in leads.items()], ignore_index=True)
+
+    email, links = dedupe_keys(leads, rules)
+    labels = link_duplicates(email, links, len(leads))
+
+    # Survivor: the first row of each cluster, with its blank cells filled from the other rows in cluster order.
+    # The masked frame only picks the fill values; cells that are kept keep their original representation.
+    blank = leads.isna() | (leads == '')
+    fill = leads.mask(blank).groupby(labels, sort=False).first()
+    survivor_positions = np.flatnonzero(labels == np.arange(len(leads)))
+    survivors = leads.iloc[survivor_positions]
+    fill.index = survivors.index
+    survivors = survivors.mask(blank.iloc[survivor_positions] & fill.notna(), fill)
+
+    # Report: one line per lead in a cluster that actually merged rows, grouped by cluster
+    cluster_sizes = np.bincount(labels, minlength=len(leads))
+    is_duplicate = cluster_sizes[labels] > 1
+    plan = normalizer.compile_rules(rules)
+    report_columns = [source_column] + [plan.output_name(name) for name in ['First Name', 'Last Name', 'Email', 'Phone', 'PostalCode']]
+    report_columns = [column for column in report_columns if column in leads.columns]
+    report = leads.loc[is_duplicate, report_columns]
+    report.insert(0, 'cluster_size', cluster_sizes[labels[is_duplicate]])
+    report.insert(0, 'cluster_id', leads.index[labels[is_duplicate]])
+    report = report.sort_values('cluster_id', kind='stable')
+
+    print(f"[i] DEDUPE: {len(leads)} LEADS -> {len(survivors)} SURVIVORS ({report['cluster_id'].nunique()} DUPLICATE CLUSTERS)")
+    return survivors, report
+
+# Function to flatten one SF object into its shared per-order values and its order lines
+def flatten_receipt_object(sf_object):
+    # Extract and flatten customer data
+    customer_data = sf_object.get('customer', {})
+    flat_customer = {f"{k}": v for k, v in customer_data.items()}
+
+    # Extract billing address separately as it's nested
+    billing_address = customer_data.get('billing_address', {})
+    flat_customer.update({f"billing_{k}": v for k, v in billing_address.items()})
+
+    shipping_address = customer_data.get('shipping_address', {})
+    flat_customer.update({f"shipping_{k}": v for k, v in shipping_address.items()})
+
+    # Other top-level keys override customer values, as order line values override both
+    flat_customer.update({k: v for k, v in sf_object.items() if k not in ['customer', 'order_lines']})
+
+    return flat_customer, sf_object.get('order_lines', [])
+
+# Function to collect the receipt columns, in first-seen order, in a single pass over the SF objects
+def receipt_columns(sf_objects):
+    columns = {}
     for sf_object in sf_objects:
-        # Extract and flatten customer data
-        customer_data = sf_object.get('customer', {})
-        flat_customer = {f"{k}": v for k, v in customer_data.items()}
-        
-        # Extract billing address separately as it's nested
-        billing_address = customer_data.get('billing_address', {})
-        flat_billing = {f"billing_{k}": v for k, v in billing_address.items()}
-        
-        shipping_address = customer_data.get('shipping_address', {})
-        flat_shipping = {f"shipping_{k}": v for k, v in shipping_address.items()}
-        
-        # Combine flattened customer and billing data
-        flat_customer.update(flat_billing)
-        flat_customer.update(flat_shipping)
-        
-        # Extract order lines
-        order_lines = sf_object.get('order_lines', [])
-        
-        # Extract other top-level keys
-        other_data = {k: v for k, v in sf_object.items() if k not in ['customer', 'order_lines']}
-        
-        # Create a row for each order line
+        shared_values, order_lines = flatten_receipt_object(sf_object)
+        if order_lines:
+            columns.update(dict.fromkeys(shared_values))
         for line in order_lines:
-            row_data = {}
-            row_data.update(flat_customer)
-            row_data.update(other_data)
-            row_data.update(line)
-            flattened_data.append(row_data)
-    
-    # Create DataFrame
-    df = pd.DataFrame(flattened_data)
-    
-    # Save to Excel
-    df.to_excel(filename, index=False)
-    print(f"[i] {filename} SAVED")
+            columns.update(dict.fromkeys(line))
+    return list(columns)
 
-    
+# Function to convert a receipt value into something the row writers accept
+def receipt_cell_value(value):
+    if isinstance(value, (dict, list, tuple)):
+        return str(value)
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
 
+# Generator of receipt rows as lists aligned to columns
+def iter_receipt_rows(sf_objects, columns):
+    for sf_object in sf_objects:
+        shared_values, order_lines = flatten_receipt_object(sf_object)
+        for line in order_lines:
+            yield [receipt_cell_value(line[column] if column in line else shared_values.get(column)) for column in columns]
+
+def create_receipt_xlsx(sf_objects, filename):
+    # One row per order line, streamed straight to a write-only XLSX (or CSV for .csv filenames);
+    # customer values are flattened once per SF object instead of being copied into a dict per line
+    sf_objects = list(sf_objects)
+    columns = receipt_columns(sf_objects)
+
+    if os.path.splitext(filename)[1].lower() == '.csv':
+        with open(filename, 'w', newline='', encoding='utf-8') as receipt_file:
+            writer = csv.writer(receipt_file)
+            writer.writerow(columns)
+            for row in iter_receipt_rows(sf_objects, columns):
+                writer.writerow(['' if value is None else value for value in row])
+    else:
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(columns)
+        for row in iter_receipt_rows(sf_objects, columns):
+            sheet.append(row)
+        workbook.save(filename)
+
+    print(f"[i] {filename} SAVED")
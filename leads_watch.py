@@ -0,0 +1,195 @@
+# Watch-folder daemon for continuous lead normalization
+'''
+SOP Steps:
+
+1. Start the watcher once (it keeps running until Ctrl+C):
+        python3 leads_watch.py ~/Desktop/LEAD-INBOX --workers 2
+2. Drop or copy event exports (.csv / .xlsx) into the inbox folder
+3. Each file is picked up as soon as its copy has finished, normalized by a warm worker and written to the
+   output folder (default: LEAD-NORM on the desktop) with '_normalized' appended to its name
+4. The input is then moved to inbox/processed (or inbox/failed, inbox/skipped); queue depth and per-file latency are kept
+   up to date in watch_metrics.json in the output folder
+'''
+
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+
+# Imported once at startup so pandas, the mapping tables and FSNormalizer stay warm for every file
+from leads_norm_functions import normalizer, normalize_input_file
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx')
+METRICS_FILE = 'watch_metrics.json'
+
+
+def configure_worker(output_dir):
+    # Runs once in each worker process: point its (already imported) normalizer at the output folder.
+    # Ctrl+C is left to the parent, which lets in-flight files finish before shutting the pool down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    normalizer.path_to_desktop = output_dir
+    normalizer.processing_subfolder = ''
+
+
+class WatchFolder:
+    def __init__(self, inbox, output_dir, max_workers=2, max_in_flight=None, interval=1.0, output_format='xlsx', chunksize=None, rules=None, compact=False):
+        self.inbox = inbox
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight or 2 * max_workers
+        self.interval = interval
+        self.output_format = output_format
+        self.chunksize = chunksize
+        self.rules = rules
+        self.compact = compact
+
+        self.last_seen = {}      # path -> (size, mtime) at the previous scan
+        self.queued = set()      # paths that are pending or in flight
+        self.pending = deque()   # (path, detected_at) waiting for a worker slot
+        self.in_flight = {}      # future -> (path, detected_at)
+        self.latencies = deque(maxlen=1000)
+        self.processed = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def scan(self):
+        # Queue a file once its size and mtime have not changed for one poll interval, i.e. its copy has finished
+        current = {}
+        for entry in os.scandir(self.inbox):
+            if entry.is_file() and entry.name.lower().endswith(SUPPORTED_EXTENSIONS) and not entry.name.startswith(('.', '~$')):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue  # removed between listing and stat
+                current[entry.path] = (stat.st_size, stat.st_mtime_ns)
+
+        for path, signature in current.items():
+            if path not in self.queued and self.last_seen.get(path) == signature:
+                self.pending.append((path, time.time()))
+                self.queued.add(path)
+        self.last_seen = current
+
+    def submit(self, executor):
+        # Bounded: never more than max_in_flight files handed to the pool at once
+        while self.pending and len(self.in_flight) < self.max_in_flight:
+            path, detected_at = self.pending.popleft()
+            future = executor.submit(normalize_input_file, path, self.chunksize, self.output_format, rules=self.rules, compact=self.compact,
+                                     skip_normalized=False)
+            self.in_flight[future] = (path, detected_at)
+
+    def collect(self):
+        for future in [future for future in self.in_flight if future.done()]:
+            path, detected_at = self.in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'input': path, 'status': 'error', 'rows': 0, 'error': str(e)}
+
+            latency = time.time() - detected_at
+            self.latencies.append(latency)
+            if result['status'] == 'error':
+                self.failed += 1
+                self.archive(path, 'failed')
+            elif result['status'] == 'skipped':
+                self.skipped += 1
+                self.archive(path, 'skipped')
+            else:
+                self.processed += 1
+                self.archive(path, 'processed')
+            self.queued.discard(path)
+            print(f"[i] {os.path.basename(path)}: {result['status'].upper()} - {result['rows']} ROWS, {round(latency, 2)} SECONDS FROM ARRIVAL")
+
+    def archive(self, path, subfolder):
+        # Move a handled input out of the inbox so it is not picked up again.
+        # An input deleted or renamed while it was queued is logged and skipped, not fatal to the daemon.
+        try:
+            target_dir = os.path.join(self.inbox, subfolder)
+            os.makedirs(target_dir, exist_ok=True)
+            target = os.path.join(target_dir, os.path.basename(path))
+            if os.path.exists(target):
+                base, extension = os.path.splitext(target)
+                target = f'{base}_{time.strftime("%Y%m%d-%H%M%S")}{extension}'
+            os.replace(path, target)
+        except OSError as e:
+            print(f"[!] COULD NOT MOVE {os.path.basename(path)} TO {subfolder}: {e}")
+
+    def metrics(self):
+        latencies = sorted(self.latencies)
+        percentile = lambda share: round(latencies[min(len(latencies) - 1, int(share * len(latencies)))], 3) if latencies else None
+        return {
+            'queue_depth': len(self.pending),
+            'in_flight': len(self.in_flight),
+            'processed': self.processed,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'latency_last_seconds': round(self.latencies[-1], 3) if self.latencies else None,
+            'latency_p50_seconds': percentile(0.5),
+            'latency_p95_seconds': percentile(0.95),
+            'updated_at': time.strftime('%Y-%m-%d %H:%M:%S')
+            }
+
+    def write_metrics(self):
+        metrics_path = os.path.join(self.output_dir, METRICS_FILE)
+        temp_path = f'{metrics_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as metrics_file:
+            json.dump(self.metrics(), metrics_file, indent=2)
+        os.replace(temp_path, metrics_path)
+
+    def run(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        print(f'[+] WATCHING {self.inbox} -> {self.output_dir} WITH {self.max_workers} WORKERS (Ctrl+C TO STOP)')
+
+        with ProcessPoolExecutor(max_workers=self.max_workers, initializer=configure_worker, initargs=(self.output_dir,)) as executor:
+            # Start the workers now so the first export does not pay for their imports
+            list(executor.map(time.sleep, [0] * self.max_workers))
+            try:
+                while True:
+                    self.scan()
+                    self.collect()
+                    self.submit(executor)
+                    self.write_metrics()
+                    time.sleep(self.interval)
+            except KeyboardInterrupt:
+                print(f'[i] STOPPING: WAITING FOR {len(self.in_flight)} FILE(S) IN FLIGHT')
+                wait(list(self.in_flight))
+                self.collect()
+                self.write_metrics()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Watch an inbox folder and normalize event exports as they arrive.')
+    parser.add_argument('inbox', help='folder to watch for .csv/.xlsx exports')
+    parser.add_argument('--output-dir', default=None, help='where normalized files and metrics go (default: the LEAD-NORM folder on the desktop)')
+    parser.add_argument('-j', '--workers', type=int, default=2, help='worker processes')
+    parser.add_argument('--max-in-flight', type=int, default=None, help='files handed to the workers at once (default: 2 per worker)')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between inbox scans')
+    parser.add_argument('--format', dest='output_format', choices=['xlsx', 'csv', 'parquet'], default='xlsx', help='output file format')
+    parser.add_argument('--chunksize', type=int, default=None, help='stream each input in chunks of this many rows')
+    parser.add_argument('--rules', metavar='PATH', help='vendor rule spec (.json or .yaml) applied to every file')
+    parser.add_argument('--compact', action='store_true', help='categorical/Arrow-string columns to cut worker memory')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    inbox = os.path.abspath(os.path.expanduser(args.inbox))
+    if not os.path.isdir(inbox):
+        raise FileNotFoundError(f"The inbox folder {inbox} does not exist.")
+    output_dir = os.path.abspath(os.path.expanduser(args.output_dir)) if args.output_dir else f'{normalizer.path_to_desktop}{normalizer.processing_subfolder}'
+    output_dir = os.path.join(output_dir, '')
+    # Outputs written into the inbox would be picked up again as new exports, forever
+    if os.path.normcase(os.path.realpath(output_dir)) == os.path.normcase(os.path.realpath(inbox)):
+        raise ValueError(f"The output folder {output_dir} cannot be the inbox it watches.")
+
+    rules = normalizer.load_rules(args.rules) if args.rules else None
+
+    WatchFolder(inbox, output_dir, max_workers=args.workers, max_in_flight=args.max_in_flight, interval=args.interval,
+                output_format=args.output_format, chunksize=args.chunksize, rules=rules, compact=args.compact).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+class RunReport:
+    # Per-stage instrumentation: wall time, rows/sec and (optionally) peak traced memory for each named stage
+    def __init__(self, track_memory=False):
+        self.stages = []
+        self.track_memory = track_memory
+        self.open_stages = []
+        # Only a report that started tracemalloc stops it (see close), so an outer tracer is left alone
+        self.started_tracing = track_memory and not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+
+    def close(self):
+        # Stop memory tracing (and its overhead) once the report is complete; stages already recorded are kept
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+        self.track_memory = False
+
+    def fold_peak(self):
+        # Credit the traced peak so far to every open stage, then reset it so a nested stage measures only itself
+        peak = tracemalloc.get_traced_memory()[1]
+        for record in self.open_stages:
+            record['peak_bytes'] = max(record['peak_bytes'], peak)
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        # Yields the stage record; set record['rows'] inside the block when the row count is only known at the end
+        record = {'stage': name, 'rows': rows}
+        if self.track_memory:
+            self.fold_peak()
+            record['start_bytes'] = record['peak_bytes'] = tracemalloc.get_traced_memory()[0]
+            self.open_stages.append(record)
+        start_time = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start_time
+            rows = record['rows']
+            record['rows_per_second'] = rows / record['seconds'] if rows is not None and record['seconds'] > 0 else None
+            if self.track_memory:
+                self.fold_peak()
+                self.open_stages.remove(record)
+                record['peak_memory_delta_mb'] = round((record.pop('peak_bytes') - record.pop('start_bytes')) / 1e6, 3)
+            self.stages.append(record)
+
+    def summary(self):
+        # Stages aggregated by name (chunked runs record the same stage once per chunk), in first-seen order
+        totals = {}
+        for record in self.stages:
+            total = totals.setdefault(record['stage'], {'stage': record['stage'], 'calls': 0, 'rows': 0, 'seconds': 0.0})
+            total['calls'] += 1
+            total['rows'] += record['rows'] or 0
+            total['seconds'] += record['seconds']
+            if 'peak_memory_delta_mb' in record:
+                total['peak_memory_delta_mb'] = max(total.get('peak_memory_delta_mb', 0.0), record['peak_memory_delta_mb'])
+        for total in totals.values():
+            total['rows_per_second'] = total['rows'] / total['seconds'] if total['rows'] and total['seconds'] > 0 else None
+        return list(totals.values())
+
+    @staticmethod
+    def print_stages(stages):
+        # One line per stage record or summary entry
+        for stage in stages:
+            line = f"[i] {stage['stage'].upper()}: {round(stage['seconds'], 3)} SECONDS"
+            if stage['rows_per_second'] is not None:
+                line += f" ({round(stage['rows_per_second'])} ROWS/SEC)"
+            if 'peak_memory_delta_mb' in stage:
+                line += f" | PEAK +{stage['peak_memory_delta_mb']} MB"
+            print(line)
+
+    def print_summary(self):
+        self.print_stages(self.summary())
+
+    def write_json(self, file_path, **extra):
+        report = {'stages': self.stages, 'summary': self.summary()}
+        report.update(extra)
+        with open(file_path, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, indent=2, default=str)
+        print(f"[i] RUN REPORT WRITTEN TO: {file_path}")
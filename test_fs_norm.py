@@ -0,0 +1,260 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fs_norm import FSNormalizer
+
+
+STREETS = ['1 Main St', ' 22 Oak Ave ', '500 San Fernando Rd', 'Nantucket Way', 'nan', 'NaN', '', np.nan]
+STREET2S = ['Apt 4', ' Suite 200 ', 'Fernando Plaza', 'Unit NAN', 'nan', '', np.nan]
+ZIPS = ['02134', '2134', '90210-1234', '02134-0001', '12345.0', '123456789', '9021']
+
+
+def old_normalize_data(normalizer, df):
+    # Address and ZIP handling as they were before normalize_data was vectorized (per-row df.apply / normalize_zip)
+    df['Street'] = df['Street'].astype(str).str.strip() if len(str(df['Street'])) > 3 else ''
+    df['Street2'] = df['Street2'].astype(str).str.strip() if len(str(df['Street'])) > 3 else ''
+    df['Street'] = df.apply(lambda row: f"{row['Street']}, {row['Street2']}" if 'nan' not in str(row['Street2']).lower() else row['Street'] if 'nan' not in str(row['Street']).lower() else '', axis=1)
+    df['PostalCode'] = df['PostalCode'].astype(str).apply(normalizer.normalize_zip) if 'nan' not in str(df['PostalCode']).lower() else ''
+    return df
+
+
+def random_frame(rng, rows, zips=ZIPS):
+    pick = lambda values: pd.Series(values, dtype=object).sample(rows, replace=True, random_state=rng).reset_index(drop=True)
+    return pd.DataFrame({
+        'First Name': pick(['Ann', 'Bob', np.nan]),
+        'Last Name': pick(['Lee', 'Nance']),
+        'Street': pick(STREETS),
+        'Street2': pick(STREET2S),
+        'City': pick(['Boston', 'Los Angeles']),
+        'StateCode': pick(['MA', 'CA']),
+        'CountryCode': 'US',
+        'PostalCode': pick(zips),
+        'MBL_Profession__c': pick(['MD', 'Chiropractor', np.nan]),
+        })
+
+
+@pytest.fixture
+def normalizer():
+    return FSNormalizer()
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_address_matches_row_by_row_implementation(normalizer, seed):
+    rng = np.random.RandomState(seed)
+    df = random_frame(rng, rng.randint(1, 40))
+    expected = old_normalize_data(normalizer, df.copy())
+    actual = normalizer.normalize_data(df.copy())
+    assert actual['address'].tolist() == expected['Street'].tolist()
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_zip_matches_normalize_zip(normalizer, seed):
+    # No missing ZIPs: the old column-level guard applied normalize_zip to every value
+    rng = np.random.RandomState(seed)
+    df = random_frame(rng, rng.randint(1, 40))
+    expected = old_normalize_data(normalizer, df.copy())
+    actual = normalizer.normalize_data(df.copy())
+    assert actual['zip_postal'].tolist() == expected['PostalCode'].tolist()
+
+
+def test_missing_zip_only_blanks_its_own_row(normalizer):
+    # The old guard blanked the whole column when any ZIP was missing
+    df = random_frame(np.random.RandomState(0), 3)
+    df['PostalCode'] = ['02134', np.nan, '90210-1234']
+    assert normalizer.normalize_data(df)['zip_postal'].tolist() == ['02134', '', '90210']
+
+
+def test_normalize_zips_strips_padding_and_float_suffixes(normalizer):
+    # Where normalize_zip kept ' 1000' and '2134.'
+    zips, valid = normalizer.normalize_zips(pd.Series([' 10001 ', '2134.0']))
+    assert zips.tolist() == ['10001', '02134']
+    assert valid.tolist() == [True, True]
+
+
+def test_normalize_zips_handles_float_typed_codes(normalizer):
+    zips, valid = normalizer.normalize_zips(pd.Series([2134.0, np.nan, 90210.0]))
+    assert zips.iloc[[0, 2]].tolist() == ['02134', '90210']
+    assert pd.isna(zips.iloc[1])
+    assert valid.tolist() == [True, False, True]
+
+
+NAMES = ['Dr John Van Dyke', 'Mrs. Ann Lee, RN', 'Prof. Mei Ito', 'Cher', '', '  Bob   Ray  ', 'Ms Jo-Ann O\'Neil, ND, MD', 'Mr', 'Drew Barry', np.nan]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_split_name_matches_split_names(normalizer, seed):
+    names = pd.Series(NAMES, dtype=object).sample(30, replace=True, random_state=seed).reset_index(drop=True)
+    expected = normalizer.split_names(names)
+    for full_name, (first_name, last_name) in zip(names, expected.itertuples(index=False)):
+        assert normalizer.split_name(full_name).tolist() == [first_name, last_name]
+
+
+def test_split_names_rules(normalizer):
+    parts = normalizer.split_names(pd.Series(['Dr John Van Dyke', 'Drew Barry', 'Mrs. Ann Lee, RN', '', np.nan]))
+    assert parts.values.tolist() == [['John', 'Van Dyke'], ['Drew', 'Barry'], ['Ann', 'Lee'], ['', ''], ['', '']]
+
+
+# =========================== chunked streaming ===========================
+
+INPUT_COLUMNS = ['First Name', 'Last Name', 'Company', 'Email', 'Phone', 'Street', 'Street2', 'City',
+                 'StateCode', 'CountryCode', 'PostalCode', 'LeadSource', 'MBL_Profession__c']
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'parquet', 'xlsx'])
+def test_chunked_header_only_xlsx_writes_header_only_output(normalizer, tmp_path, output_format):
+    if output_format == 'parquet':
+        pytest.importorskip('pyarrow')
+    pd.DataFrame(columns=INPUT_COLUMNS).to_excel(tmp_path / 'empty.xlsx', index=False)
+    normalizer.path_to_desktop = str(tmp_path) + '/'
+    normalizer.processing_subfolder = ''
+
+    assert normalizer.normalize_file_chunked(str(tmp_path / 'empty.xlsx'), f'out.{output_format}', chunksize=10, raise_errors=True) == 0
+    output = tmp_path / f'out.{output_format}'
+    written = {'csv': pd.read_csv, 'parquet': pd.read_parquet, 'xlsx': pd.read_excel}[output_format](output)
+    assert written.empty
+    assert 'zip_postal' in written.columns
+
+
+def test_chunked_sheet_without_header_writes_nothing(normalizer, tmp_path):
+    import openpyxl
+    openpyxl.Workbook().save(tmp_path / 'blank.xlsx')
+    normalizer.path_to_desktop = str(tmp_path) + '/'
+    normalizer.processing_subfolder = ''
+
+    assert normalizer.normalize_file_chunked(str(tmp_path / 'blank.xlsx'), 'out.csv', raise_errors=True) == 0
+    assert not (tmp_path / 'out.csv').exists()
+
+
+# =========================== phones ===========================
+
+def test_normalize_phones_formats(normalizer):
+    phones = pd.Series(['555.123.0000', '+1 (555) 123-4567', '555-123-4567 ext. 89', '5551234567x12', '555 123 4567 #3',
+                        '5551234567.0', '123', np.nan])
+    digits, valid = normalizer.normalize_phones(phones)
+    assert digits.iloc[:7].tolist() == ['5551230000', '5551234567', '5551234567', '5551234567', '5551234567', '5551234567', '123']
+    assert pd.isna(digits.iloc[7])
+    assert valid.tolist() == [True, True, True, True, True, True, False, False]
+
+
+def test_normalize_phones_handles_float_typed_numbers(normalizer):
+    digits, valid = normalizer.normalize_phones(pd.Series([5551234567.0, np.nan, 15551230000.0]))
+    assert digits.iloc[[0, 2]].tolist() == ['5551234567', '5551230000']
+    assert pd.isna(digits.iloc[1])
+    assert valid.tolist() == [True, False, True]
+
+
+# =========================== geography ===========================
+
+def test_normalize_zips_treats_blank_as_missing(normalizer):
+    zips, valid = normalizer.normalize_zips(pd.Series(['', ' ', '02134']))
+    assert zips.isna().tolist() == [True, True, False]
+    assert valid.tolist() == [False, False, True]
+
+
+def test_normalize_states_canonicalizes_names_and_codes(normalizer):
+    states, recognized = normalizer.normalize_states(pd.Series(['massachusetts', ' ca ', 'New  York', 'N.Y.', 'Ontario', np.nan]))
+    assert states.iloc[:5].tolist() == ['MA', 'CA', 'NY', 'NY', 'Ontario']
+    assert pd.isna(states.iloc[5])
+    assert recognized.tolist() == [True, True, True, True, False, False]
+
+
+def test_zip_state_mismatches_flags_only_us_rows_in_another_state(normalizer):
+    zips = pd.Series(['02134', '02134', '90210', '02134', 'ABCDE', np.nan])
+    states = pd.Series(['MA', 'CA', 'CA', 'CA', 'CA', 'CA'])
+    countries = pd.Series(['US', 'United States', 'USA', 'CA', 'US', np.nan])
+    mismatch = normalizer.zip_state_mismatches(zips, states, countries)
+    # Row 3 is Canadian, rows 4 and 5 have no usable ZIP
+    assert mismatch.tolist() == [False, True, False, False, False, False]
+
+
+def test_build_zip3_table_expands_ranges(normalizer, tmp_path):
+    (tmp_path / 'ranges.csv').write_text('zip3_start,zip3_end,state\n010,027,MA\n900,961,CA\n')
+    normalizer.zip3_table_path = str(tmp_path / 'zip3.npy')
+    table = normalizer.build_zip3_table(str(tmp_path / 'ranges.csv'))
+
+    assert table[10] == table[27] == 'MA' and table[28] == ''
+    assert normalizer.load_zip3_table()[902] == 'CA'
+    assert normalizer.zip_state_mismatches(pd.Series(['02134', '90210']), pd.Series(['CA', 'CA'])).tolist() == [True, False]
+
+
+def test_compact_frame_reports_memory_per_column(normalizer):
+    df = pd.DataFrame({'LeadSource': ['Booth Scan'] * 50, 'City': ['Boston'] * 50, 'Count': range(50)})
+    compacted, report = normalizer.compact_frame(df, categorical_columns=['LeadSource'])
+
+    assert isinstance(compacted['LeadSource'].dtype, pd.CategoricalDtype)
+    assert pd.api.types.is_string_dtype(compacted['City'].dtype) and compacted['City'].dtype != object
+    assert report['LeadSource']['dtype_before'] == 'object' and report['LeadSource']['dtype_after'] == 'category'
+    assert report['LeadSource']['bytes_after'] < report['LeadSource']['bytes_before']
+    assert report['Count'] == {'dtype_before': 'int64', 'dtype_after': 'int64',
+                               'bytes_before': report['Count']['bytes_after'], 'bytes_after': report['Count']['bytes_after']}
+
+
+# =========================== vendor rules ===========================
+
+VENDOR_RULES = {
+    'column_map': {'Zip': 'PostalCode', 'Given': 'First Name'},
+    'value_maps': {'country_code': {'US': 'United States'}},
+    'derived': {'full_name': '{first_name} {last_name}'},
+    'renames': {'zip_postal': 'zip'},
+    'drops': ['city'],
+    }
+
+
+def test_normalization_plan_applies_vendor_rules(normalizer):
+    df = random_frame(np.random.RandomState(0), 3).rename(columns={'PostalCode': 'Zip', 'First Name': 'Given'})
+    df['Given'] = ['Ann', np.nan, 'Bob']
+    df['Last Name'] = ['Lee', 'Nance', 'Ray']
+    df['Zip'] = '02134'
+    normalized = normalizer.normalize_data(df, VENDOR_RULES)
+
+    assert normalized.columns.tolist() == ['first_name', 'last_name', 'address', 'state_code', 'country_code', 'zip', 'MBL_Profession__c', 'full_name']
+    assert normalized['zip'].tolist() == ['02134'] * 3
+    assert normalized['country_code'].tolist() == ['United States'] * 3
+    # A blank field leaves no stray separator
+    assert normalized['full_name'].tolist() == ['Ann Lee', 'Nance', 'Bob Ray']
+
+
+def test_derived_column_with_unknown_field_raises(normalizer):
+    df = random_frame(np.random.RandomState(0), 2)
+    with pytest.raises(ValueError, match='unknown column: middle_name'):
+        normalizer.normalize_data(df, {'derived': {'full_name': '{first_name} {middle_name}'}})
+
+
+def test_load_rules_reads_json_and_yaml(normalizer, tmp_path):
+    import json
+    (tmp_path / 'vendor.json').write_text(json.dumps(VENDOR_RULES))
+    assert normalizer.load_rules(str(tmp_path / 'vendor.json')) == VENDOR_RULES
+
+    yaml = pytest.importorskip('yaml')
+    (tmp_path / 'vendor.yaml').write_text(yaml.safe_dump(VENDOR_RULES))
+    assert normalizer.load_rules(str(tmp_path / 'vendor.yaml')) == VENDOR_RULES
+    (tmp_path / 'empty.yml').write_text('')
+    assert normalizer.load_rules(str(tmp_path / 'empty.yml')) == {}
+
+
+# =========================== column operations ===========================
+
+def test_apply_column_operations_matches_single_operations(normalizer):
+    operations = [('add', 'Notes', 'Email'), ('remove', 'Phone'), ('rename', 'Email', 'email'), ('add', 'Source', None)]
+    make_rows = lambda: [{'Name': 'Ann', 'Email': 'ann@example.com', 'Phone': '555'}, {'Name': 'Bob', 'Email': '', 'Phone': ''}]
+
+    headers, data = ['Name', 'Email', 'Phone'], make_rows()
+    normalizer.add_column(headers, data, 'Notes', 'Email')
+    normalizer.remove_column(headers, data, 'Phone')
+    normalizer.rename_column(headers, data, 'Email', 'email')
+    normalizer.add_column(headers, data, 'Source')
+
+    fused_headers, fused_data = ['Name', 'Email', 'Phone'], make_rows()
+    first_row = fused_data[0]
+    normalizer.apply_column_operations(fused_headers, fused_data, operations)
+
+    assert fused_headers == headers == ['Name', 'email', 'Notes', 'Source']
+    assert fused_data == data
+    # Rows are updated in place, not replaced
+    assert fused_data[0] is first_row and list(first_row) == fused_headers
+
+
+def test_apply_column_operations_rejects_unknown_operation(normalizer):
+    with pytest.raises(ValueError):
+        normalizer.apply_column_operations(['Name'], [{'Name': 'Ann'}], [('move', 'Name')])
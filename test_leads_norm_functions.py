@@ -0,0 +1,198 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from leads_norm_functions import (normalizer, dedupe_leads, normalize_files_parallel, read_normalized_output,
+                                  batch_emails, bulk_check_leads, lookup_account_ids, InMemoryAccountClient,
+                                  parse_date, parse_date_column, split_name)
+
+
+def leads_frame(rows):
+    columns = ['first_name', 'last_name', 'account_email', 'account_phone', 'zip_postal', 'city']
+    return pd.DataFrame(rows, columns=columns)
+
+
+@pytest.fixture
+def output_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(normalizer, 'path_to_desktop', str(tmp_path) + os.sep)
+    monkeypatch.setattr(normalizer, 'processing_subfolder', 'LEAD-NORM/')
+    return tmp_path / 'LEAD-NORM'
+
+
+# =========================== dedupe_leads ===========================
+
+def test_dedupe_clusters_shared_email_phone_and_name_zip():
+    leads = leads_frame([
+        ['Ann', 'Lee', 'Ann@Example.com ', '', '02134', 'Boston'],
+        ['Ann', 'Lee', 'ann@example.com', '(555) 123-4567', '', ''],
+        ['A', 'Ray', '', '555-123-4567', '', ''],               # same phone as row 1 -> same cluster (transitive)
+        ['Bob', 'Smith', '', '', '90210', 'Los Angeles'],
+        ['Bob', 'Smith', 'bob@example.com', '', '90210', ''],  # same last name + ZIP + first name as row 3
+        ['Cara', 'Smith', '', '', '90210', ''],                # same address, different first name: kept apart
+        ])
+    survivors, report = dedupe_leads(leads)
+
+    assert survivors.index.tolist() == [0, 3, 5]
+    assert report.groupby('cluster_id')['cluster_size'].first().to_dict() == {0: 3, 3: 2}
+
+
+def test_dedupe_never_joins_different_emails_through_shared_phone_or_name_zip():
+    leads = leads_frame([
+        ['Ann', 'Lee', 'ann@clinic.com', '555-123-4567', '', ''],
+        ['Bob', 'Ray', 'bob@clinic.com', '555-123-4567', '', ''],  # front-desk phone: a different person
+        ['Front', 'Desk', '', '555-123-4567', '', ''],             # phone shared by two emails: ambiguous, kept apart
+        ['Cy', 'Ito', 'cy@a.com', '', '02134', ''],
+        ['Cy', 'Ito', '', '5550001111', '02134', ''],             # bridges cy@a.com and cy@b.com: kept apart
+        ['Cy', 'Ito', 'cy@b.com', '5550001111', '', ''],
+        ])
+    survivors, report = dedupe_leads(leads)
+
+    assert survivors.index.tolist() == [0, 1, 2, 3, 4, 5]
+    assert report.empty
+
+
+def test_dedupe_fills_blanks_from_cluster_and_keeps_other_cells():
+    leads = leads_frame([
+        ['Ann', 'Lee', 'ann@example.com', '', '02134', ''],
+        ['Ann', 'Lee', 'ann@example.com', '5551234567', '02134', 'Boston'],
+        ['Dev', 'Ito', 'dev@example.com', '', '', ''],
+        ])
+    survivors, _ = dedupe_leads(leads)
+
+    assert survivors.loc[0, 'account_phone'] == '5551234567'
+    assert survivors.loc[0, 'city'] == 'Boston'
+    # A blank with nothing to fill it from stays the blank string it was, not NaN
+    assert survivors.loc[2].tolist() == ['Dev', 'Ito', 'dev@example.com', '', '', '']
+
+
+def test_dedupe_across_files_records_source():
+    first = leads_frame([['Ann', 'Lee', 'ann@example.com', '', '02134', 'Boston']])
+    second = leads_frame([['Ann', 'Lee', 'ANN@example.com', '', '02134', 'Boston']])
+    survivors, report = dedupe_leads({'a.csv': first, 'b.csv': second})
+
+    assert len(survivors) == 1
+    assert report['source_file'].tolist() == ['a.csv', 'b.csv']
+
+
+def test_dedupe_without_duplicates_keeps_every_row():
+    leads = leads_frame([['Ann', 'Lee', f'ann{i}@example.com', '', '', ''] for i in range(5)])
+    survivors, report = dedupe_leads(leads)
+    assert len(survivors) == 5
+    assert report.empty
+
+
+# =========================== batch dedupe ===========================
+
+def write_export(path, emails):
+    pd.DataFrame({
+        'First Name': 'Ann', 'Last Name': [f'Lee{i}' for i in range(len(emails))], 'Company': 'Clinic', 'Email': emails,
+        'Phone': np.nan, 'Street': '1 Main St', 'Street2': np.nan, 'City': 'Boston', 'StateCode': 'MA',
+        'CountryCode': 'US', 'PostalCode': '02134', 'LeadSource': 'Booth Scan', 'MBL_Profession__c': 'MD',
+        }).to_csv(path, index=False)
+
+
+def test_batch_dedupe_writes_survivors_and_report(tmp_path, output_dir):
+    write_export(tmp_path / 'expo-a.csv', ['ann@example.com', 'bo@example.com'])
+    write_export(tmp_path / 'expo-b.csv', ['ANN@example.com'])
+
+    normalize_files_parallel([str(tmp_path / 'expo-*.csv')], max_workers=1, output_format='csv', dedupe=True)
+
+    survivors = read_normalized_output(str(output_dir / 'deduped_leads.csv'), 'csv')
+    report = read_normalized_output(str(output_dir / 'dedupe_report.csv'), 'csv')
+    assert sorted(survivors['account_email']) == ['ann@example.com', 'bo@example.com']
+    assert sorted(report['source_file']) == ['expo-a.csv', 'expo-b.csv']
+
+
+def test_batch_dedupe_skips_missing_keys_and_follows_renames(tmp_path, output_dir):
+    write_export(tmp_path / 'expo.csv', ['ann@example.com', 'ANN@example.com'])
+    pd.read_csv(tmp_path / 'expo.csv').drop(columns='Phone').to_csv(tmp_path / 'expo.csv', index=False)
+    rules = {'renames': {'account_email': 'email'}}
+
+    normalize_files_parallel([str(tmp_path / 'expo.csv')], max_workers=1, output_format='csv', rules=rules, dedupe=True)
+
+    survivors = read_normalized_output(str(output_dir / 'deduped_leads.csv'), 'csv')
+    report = read_normalized_output(str(output_dir / 'dedupe_report.csv'), 'csv')
+    assert survivors['email'].tolist() == ['ann@example.com']
+    assert 'account_phone' not in report.columns
+
+
+# =========================== account matching ===========================
+
+def test_batch_emails_bounds_count_and_in_clause_length():
+    emails = [f'user{i}@example.com' for i in range(10)]
+    assert [len(batch) for batch in batch_emails(emails, batch_size=4)] == [4, 4, 2]
+    # Each quoted email costs len + 4 characters of the IN clause
+    assert [len(batch) for batch in batch_emails(emails, batch_size=100, max_length=3 * 21)] == [3, 3, 3, 1]
+
+
+def test_bulk_check_leads_splits_existing_and_new():
+    client = InMemoryAccountClient({'Ann@Example.com': '001A'})
+    leads = [{'account_email': ' ann@example.com'}, {'account_email': 'new@example.com'}, {'account_email': float('nan')}]
+    existing, new = bulk_check_leads(None, leads, client=client, batch_size=1)
+
+    assert [lead['account_id'] for lead in existing] == ['001A']
+    assert len(new) == 2
+    assert client.queries == 2
+
+
+def test_account_id_cache_is_reused_per_client_only():
+    first = InMemoryAccountClient({'ann@example.com': '001A'})
+    lookup_account_ids(['ann@example.com', 'bo@example.com'], first)
+    assert lookup_account_ids(['ann@example.com', 'bo@example.com'], first) == {'ann@example.com': '001A'}
+    assert first.queries == 1
+
+    # Another client (another org, or the live org after an offline run) gets its own answers
+    second = InMemoryAccountClient({'bo@example.com': '001B'})
+    assert lookup_account_ids(['ann@example.com', 'bo@example.com'], second) == {'bo@example.com': '001B'}
+    assert second.queries == 1
+
+
+# =========================== dates ===========================
+
+def test_parse_date_column_matches_parse_date():
+    dates = pd.Series([pd.Timestamp('2024-05-06 13:45'), '05-07-2024', '2024-05-08 10:30:00', 'TBD', np.nan, datetime(2024, 5, 9, 8, 0)])
+    parsed, invalid = parse_date_column(dates)
+
+    for value, result in zip(dates, parsed):
+        if isinstance(value, (str, datetime)) and value != 'TBD':
+            assert result == parse_date(value)
+    # Timestamps and datetimes keep their time; text is parsed as a date only
+    assert parsed.tolist()[:3] == [pd.Timestamp('2024-05-06 13:45'), pd.Timestamp('2024-05-07'), pd.Timestamp('2024-05-08')]
+    assert invalid.tolist() == [False, False, False, True, False, False]
+
+
+# =========================== names ===========================
+
+def test_split_name_uses_the_normalizer_rules():
+    assert split_name('Dr John Van Dyke') == ('John', 'Van Dyke')
+    assert split_name('') == ('', '')
+    assert split_name(np.nan) == ('', '')
+
+
+# =========================== result cache ===========================
+
+def test_cache_merges_appended_rows_and_survives_uncached_rewrites(tmp_path, output_dir):
+    export = tmp_path / 'expo.csv'
+    output = str(output_dir / 'expo_normalized.csv')
+    emails = [f'lead{i}@example.com' for i in range(15)]
+    run = lambda **options: normalize_files_parallel([str(export)], max_workers=1, output_format='csv', **options)[0]
+
+    write_export(export, emails[:10])
+    assert run(use_cache=True)['status'] == 'ok'
+    assert run(use_cache=True)['status'] == 'cached'
+
+    # Grown export: only the new rows are normalized and appended
+    write_export(export, emails)
+    run(use_cache=True)
+    assert read_normalized_output(output, 'csv')['account_email'].tolist() == emails
+
+    # An uncached rewrite drops the entry, so the next cached run cannot append to (or reuse) a changed output
+    write_export(export, emails[:10])
+    run(use_cache=True)
+    write_export(export, emails)
+    run(use_cache=False)
+    run(use_cache=True)
+    assert read_normalized_output(output, 'csv')['account_email'].tolist() == emails
@@ -0,0 +1,8 @@
+import pytest
+
+from leads_watch import main
+
+
+def test_output_dir_cannot_be_the_inbox(tmp_path):
+    with pytest.raises(ValueError):
+        main([str(tmp_path), '--output-dir', str(tmp_path / '.' / '')])
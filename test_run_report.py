@@ -0,0 +1,36 @@
+import tracemalloc
+
+from run_report import RunReport
+
+
+def test_stage_records_rows_and_time():
+    report = RunReport()
+    with report.stage('read') as record:
+        record['rows'] = 10
+    with report.stage('read', rows=5):
+        pass
+
+    summary = report.summary()
+    assert [(stage['stage'], stage['calls'], stage['rows']) for stage in summary] == [('read', 2, 15)]
+    assert all(stage['seconds'] >= 0 for stage in report.stages)
+
+
+def test_close_stops_tracing_it_started():
+    report = RunReport(track_memory=True)
+    with report.stage('build', rows=1):
+        data = [0] * 100_000
+    report.close()
+
+    assert not tracemalloc.is_tracing()
+    assert report.stages[0]['peak_memory_delta_mb'] > 0
+    del data
+
+
+def test_close_leaves_an_outer_tracer_running():
+    tracemalloc.start()
+    try:
+        report = RunReport(track_memory=True)
+        report.close()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()